@@ -0,0 +1,129 @@
+"""
+Description: A local on-disk cache of datasets after pre-processing (see pre_processing.py), so that a dataset is read
+    and pre-processed (including RMEP for every numerical column) only once, and loaded directly on subsequent runs. A
+    cached dataset is stored in 3 files named by its key, the hash of the contents of its *.data and *.names files and
+    the version of pre-processing:
+        <key>.matrix.npy: the matrix of attributes of its EncodedDataset (see encoded.py)
+        <key>.classes.npy: the vector of class codes of its EncodedDataset
+        <key>.json: the class labels, the value codes of the columns encoded by EncodedDataset (as a list of pairs
+            [column No., [[value, code], ...]]) and the parameters of pre-processing (in the form of model.py)
+    The NumPy files are loaded as memory maps. The JSON file is written at last, so a cache entry is used only when it's
+    complete.
+Input: the paths of *.data and *.names files
+Output: an EncodedDataset and the parameters of pre-processing
+Author: CBA Studio
+"""
+from read import read
+from pre_processing import pre_process
+from pre_processing import add_value_codes
+from encoded import EncodedDataset
+import model
+import numpy as np
+import hashlib
+import json
+import os
+
+
+# change it whenever pre-processing gives a different result, so that the datasets cached before are not used
+CACHE_VERSION = 3
+
+
+# get the key of the dataset in cache
+def get_cache_key(data_path, scheme_path):
+    digest = hashlib.sha256()
+    digest.update(('cba-cache-%d' % CACHE_VERSION).encode())
+    for path in (data_path, scheme_path):
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+# write a file by writer(temporary path), then move it to path, so that no partial file is left at path
+def _write_atomically(path, writer):
+    temporary_path = path + '.tmp%d' % os.getpid()
+    try:
+        writer(temporary_path)
+        os.replace(temporary_path, path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+
+
+# save the EncodedDataset and the parameters of pre-processing into cache_dir with key
+def save_dataset(cache_dir, key, dataset, params):
+    os.makedirs(cache_dir, exist_ok=True)
+    prefix = os.path.join(cache_dir, key)
+
+    def write_array(array):
+        def writer(path):
+            with open(path, 'wb') as file:
+                np.save(file, array)
+        return writer
+
+    def write_meta(path):
+        with open(path, 'w') as file:
+            json.dump({'version': CACHE_VERSION, 'class_labels': dataset.class_labels,
+                       'value_codes': [[column, [[value, code] for value, code in codes.items()]]
+                                       for column, codes in dataset.value_codes.items()],
+                       'preprocessing': model.encode_params(params)}, file, separators=(',', ':'))
+
+    _write_atomically(prefix + '.matrix.npy', write_array(dataset.matrix))
+    _write_atomically(prefix + '.classes.npy', write_array(dataset.classes))
+    _write_atomically(prefix + '.json', write_meta)
+
+
+# load the dataset with key from cache_dir, the arrays are memory-mapped
+# Returned value: the EncodedDataset and the parameters of pre-processing, or None if it isn't cached
+def load_cached_dataset(cache_dir, key):
+    prefix = os.path.join(cache_dir, key)
+    try:
+        with open(prefix + '.json', 'r') as file:
+            meta = json.load(file)
+        if meta.get('version') != CACHE_VERSION:
+            return None
+        matrix = np.load(prefix + '.matrix.npy', mmap_mode='r')
+        classes = np.load(prefix + '.classes.npy', mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    value_codes = dict((column, dict((value, code) for value, code in codes)) for column, codes in meta['value_codes'])
+    dataset = EncodedDataset.from_arrays(matrix, classes, meta['class_labels'], value_codes)
+    return dataset, model.decode_params(meta['preprocessing'])
+
+
+# main method, get the dataset after pre-processing from cache, or read and pre-process it and then put it into cache
+# cache_dir: the directory of cache, "datasets/.cache" if data_path is "datasets/*.data" by default
+# processes: see pre_process, only used when the dataset isn't cached
+# Returned value: the EncodedDataset and the parameters of pre-processing (see pre_process), including the codes of
+#   the columns encoded by EncodedDataset (see add_value_codes)
+def load_dataset(data_path, scheme_path, cache_dir=None, processes=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(data_path), '.cache')
+    key = get_cache_key(data_path, scheme_path)
+    cached = load_cached_dataset(cache_dir, key)
+    if cached is not None:
+        return cached
+
+    data, attributes, value_type = read(data_path, scheme_path)
+    params = dict()
+    dataset = EncodedDataset(pre_process(data, attributes, value_type, params, processes))
+    add_value_codes(params, dataset.value_codes)
+    save_dataset(cache_dir, key, dataset, params)
+    return dataset, params
+
+
+# just for test
+if __name__ == '__main__':
+    import tempfile
+    import time
+
+    test_cache_dir = tempfile.mkdtemp()
+    for i in range(2):
+        start_time = time.time()
+        test_dataset, test_params = load_dataset('datasets/iris.data', 'datasets/iris.names', test_cache_dir)
+        print(len(test_dataset), test_params['walls'], '%.4f s' % (time.time() - start_time))
+    print(os.listdir(test_cache_dir))
+    for i in range(2):
+        test_dataset, test_params = load_dataset('datasets/car.data', 'datasets/car.names', test_cache_dir)
+        print(test_dataset.value_codes, test_params['codes'])   # should be the same both times
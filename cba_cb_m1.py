@@ -9,7 +9,8 @@ Author: CBA Studio
 Reference: http://www.docin.com/p-586554186.html
 """
 import cba_rg
-from functools import cmp_to_key
+import vertical
+import predictor
 import sys
 
 
@@ -18,8 +19,8 @@ import sys
 # else if LHSs are the same while the class labels are different, return False;
 # else (LHSs are different), return None
 def is_satisfy(datacase, rule):
-    for item in rule.cond_set:
-        if datacase[item] != rule.cond_set[item]:
+    for item, value in rule.cond_set:
+        if datacase[item] != value:
             return None
     if datacase[-1] == rule.class_label:
         return True
@@ -34,48 +35,40 @@ class Classifier:
     def __init__(self):
         self.rule_list = list()
         self.default_class = None
+        self._rule_errors = 0
         self._error_list = list()
         self._default_class_list = list()
 
     # insert a rule into rule_list, then choose a default class, and calculate the errors (see line 8, 10 & 11)
-    def insert(self, rule, dataset):
-        self.rule_list.append(rule)             # insert r at the end of C
-        self._select_default_class(dataset)     # select a default class for the current C
-        self._compute_error(dataset)            # compute the total number of errors of C
-
-    # select the majority class in the remaining data
-    def _select_default_class(self, dataset):
-        class_column = [x[-1] for x in dataset]
-        class_label = set(class_column)
+    # rule_errors: the number of cases covered by rule but not by the rules before it, while in another class
+    # class_distribution: a dict {class label: number of cases}, counting the cases not covered by any rule in C
+    def insert(self, rule, rule_errors, class_distribution):
+        self.rule_list.append(rule)                         # insert r at the end of C
+        self._rule_errors += rule_errors
+        self._select_default_class(class_distribution)      # select a default class for the current C
+        self._compute_error(class_distribution)             # compute the total number of errors of C
+
+    # select the majority class in the remaining data, the first one in class_distribution if there're several
+    def _select_default_class(self, class_distribution):
         max = 0
         current_default_class = None
-        for label in class_label:
-            if class_column.count(label) >= max:
-                max = class_column.count(label)
+        for label in class_distribution:
+            if class_distribution[label] > max:
+                max = class_distribution[label]
                 current_default_class = label
         self._default_class_list.append(current_default_class)
 
     # compute the sum of errors
-    def _compute_error(self, dataset):
-        if len(dataset) <= 0:
+    def _compute_error(self, class_distribution):
+        remaining_number = sum(class_distribution.values())
+        if remaining_number <= 0:
             self._error_list.append(sys.maxsize)
             return
 
-        error_number = 0
-
-        # the number of errors that have been made by all the selected rules in C
-        for case in dataset:
-            is_cover = False
-            for rule in self.rule_list:
-                if is_satisfy(case, rule):
-                    is_cover = True
-                    break
-            if not is_cover:
-                error_number += 1
-
-        # the number of errors to be made by the default class in the training set
-        class_column = [x[-1] for x in dataset]
-        error_number += len(class_column) - class_column.count(self._default_class_list[-1])
+        # the number of errors that have been made by all the selected rules in C, plus the number of errors to be made
+        #   by the default class in the training set
+        default_class = self._default_class_list[-1]
+        error_number = self._rule_errors + remaining_number - class_distribution[default_class]
         self._error_list.append(error_number)
 
     # see line 14 and 15, to get the final classifier
@@ -89,6 +82,15 @@ class Classifier:
         self.default_class = self._default_class_list[index]
         self._default_class_list = None
 
+    # predict the class labels of rows (a NumPy matrix or a list of data cases without class label) at once, see
+    #   predictor.py, return a NumPy vector
+    def predict_batch(self, rows):
+        return predictor.compile_classifier(self).predict_batch(rows)
+
+    # predict the class label of a data case without class label
+    def predict(self, case):
+        return self.predict_batch([case]).tolist()[0]
+
     # just print out all selected rules and default class in our classifier
     def print(self):
         for rule in self.rule_list:
@@ -96,52 +98,44 @@ class Classifier:
         print("default_class:", self.default_class)
 
 
-# sort the set of generated rules car according to the relation ">", return the sorted rule list
+# the sort key of the relation ">" (precedence): ri > rj if
+#   1. the confidence of ri > rj, or
+#   2. their confidences are the same, but support of ri > rj, or
+#   3. both confidence & support are the same, ri earlier than rj (i.e. its condset is shorter)
+# The rest ties are broken by the condsets and then the class labels, so the order is total and doesn't depend on the
+#   order in which rules are generated (e.g. by different engines, or from sets of strings under hash randomization).
+def precedence_key(rule):
+    return -rule.confidence, -rule.support, len(rule.cond_set), rule.cond_set, repr(rule.class_label)
+
+
+# sort the set of generated rules car according to the relation ">", return the sorted rule list. The index of a rule
+#   in the list is its precedence rank: ri > rj if and only if the rank of ri < rj, which is compared in O(1).
 def sort(car):
-    def cmp_method(a, b):
-        if a.confidence < b.confidence:     # 1. the confidence of ri > rj
-            return 1
-        elif a.confidence == b.confidence:
-            if a.support < b.support:       # 2. their confidences are the same, but support of ri > rj
-                return 1
-            elif a.support == b.support:
-                if len(a.cond_set) < len(b.cond_set):   # 3. both confidence & support are the same, ri earlier than rj
-                    return -1
-                elif len(a.cond_set) == len(b.cond_set):
-                    return 0
-                else:
-                    return 1
-            else:
-                return -1
-        else:
-            return -1
-
-    rule_list = list(car.rules)
-    rule_list.sort(key=cmp_to_key(cmp_method))
-    return rule_list
+    return sorted(car.rules, key=precedence_key)
 
 
 # main method of CBA-CB: M1
+# dataset: a list of data cases, its EncodedDataset (see encoded.py) or VerticalDataset (see vertical.py). The cases not
+#   covered yet are kept as a bitset, and the class distribution of them is updated by the cases each rule covers.
 def classifier_builder_m1(cars, dataset):
+    if not isinstance(dataset, vertical.VerticalDataset):
+        dataset = vertical.VerticalDataset(dataset)
     classifier = Classifier()
     cars_list = sort(cars)
+
+    remaining = dataset.all_rows
+    class_distribution = dict((label, vertical.popcount(bitset)) for label, bitset in dataset.class_bitsets.items())
     for rule in cars_list:
-        temp = []
-        mark = False
-        for i in range(len(dataset)):
-            is_satisfy_value = is_satisfy(dataset[i], rule)
-            if is_satisfy_value is not None:
-                temp.append(i)
-                if is_satisfy_value:
-                    mark = True
-        if mark:
-            temp_dataset = list(dataset)
-            for index in temp:
-                temp_dataset[index] = []
-            while [] in temp_dataset:
-                temp_dataset.remove([])
-            dataset = temp_dataset
-            classifier.insert(rule, dataset)
+        if not remaining:
+            break
+        covered = dataset.cover(rule.cond_set) & remaining
+        correct = covered & dataset.class_bitsets.get(rule.class_label, 0)
+        if correct:
+            remaining ^= covered
+            for label, bitset in dataset.class_bitsets.items():
+                class_distribution[label] -= vertical.popcount(covered & bitset)
+            rule_errors = vertical.popcount(covered) - vertical.popcount(correct)
+            classifier.insert(rule, rule_errors, class_distribution)
     classifier.discard()
     return classifier
 
@@ -11,7 +11,9 @@ Author: CBA Studio
 """
 import ruleitem
 import cba_cb_m1
-from functools import cmp_to_key
+import vertical
+import predictor
+import sys
 
 
 class Classifier_m2:
@@ -40,6 +42,15 @@ class Classifier_m2:
         self.default_class = self._default_class_list[index]
         self._default_class_list = None
 
+    # predict the class labels of rows (a NumPy matrix or a list of data cases without class label) at once, see
+    #   predictor.py, return a NumPy vector
+    def predict_batch(self, rows):
+        return predictor.compile_classifier(self).predict_batch(rows)
+
+    # predict the class label of a data case without class label
+    def predict(self, case):
+        return self.predict_batch([case]).tolist()[0]
+
     # just print out rules and default class label
     def print(self):
         for rule in self.rule_list:
@@ -49,140 +60,105 @@ class Classifier_m2:
 
 class Rule(ruleitem.RuleItem):
     """
-    A class inherited from RuleItem, adding classCasesCovered and replace field.
+    A class inherited from RuleItem, adding classCasesCovered and replace field, which are mutable. It's built from a
+    ruleitem mined by CBA-RG and shares its counts, so the dataset is not scanned again.
+    class_code: the index of class_label in the list of class labels.
+    classCasesCovered: a list, classCasesCovered[i] is the number of covered cases of the i-th class label.
     """
-    def __init__(self, cond_set, class_label, dataset):
-        ruleitem.RuleItem.__init__(self, cond_set, class_label, dataset)
-        self._init_classCasesCovered(dataset)
-        self.replace = set()
+    __slots__ = ('class_code', 'classCasesCovered', 'replace')
 
-    # initialize the classCasesCovered field
-    def _init_classCasesCovered(self, dataset):
-        class_column = [x[-1] for x in dataset]
-        class_label = set(class_column)
-        self.classCasesCovered = dict((x, 0) for x in class_label)
+    def __init__(self, rule_item, class_code, class_number):
+        self._set_fields(rule_item.cond_set, rule_item.class_label, rule_item.cond_sup_count, rule_item.rule_sup_count,
+                         rule_item.dataset_size, rule_item.coverage)
+        self.class_code = class_code
+        self.classCasesCovered = [0] * class_number
+        self.replace = set()
 
 
 # convert ruleitem of class RuleItem to rule of class Rule
-def ruleitem2rule(rule_item, dataset):
-    rule = Rule(rule_item.cond_set, rule_item.class_label, dataset)
+# class_index: a dict {class label: index}, the same for all rules
+def ruleitem2rule(rule_item, class_index):
+    rule = Rule(rule_item, class_index[rule_item.class_label], len(class_index))
     return rule
 
 
-# finds the highest precedence rule that covers the data case d from the set of rules having the same class as d.
-def maxCoverRule_correct(cars_list, data_case):
+# finds the highest precedence rule that covers the data case d from the set of rules having the same class as d (cRule)
+#   and from the set of rules having the different class as d (wRule), for every data case d at the same time. Rules
+#   are visited once in precedence order, and the cases each rule covers are got from the bitsets of vertical_dataset
+#   (see vertical.py), instead of scanning the whole cars_list for every case.
+# Return value: two lists, the index of cRule and wRule of each data case (None if no rule covers it)
+def maxCoverRules(cars_list, vertical_dataset):
+    c_rule_indexes = [None] * len(vertical_dataset)
+    w_rule_indexes = [None] * len(vertical_dataset)
+    c_rule_unknown = vertical_dataset.all_rows
+    w_rule_unknown = vertical_dataset.all_rows
     for i in range(len(cars_list)):
-        if cars_list[i].class_label == data_case[-1]:
-            if cba_cb_m1.is_satisfy(data_case, cars_list[i]):
-                return i
-    return None
-
-
-# finds the highest precedence rule that covers the data case d from the set of rules having the different class as d.
-def maxCoverRule_wrong(cars_list, data_case):
-    for i in range(len(cars_list)):
-        if cars_list[i].class_label != data_case[-1]:
-            temp_data_case = data_case[:-1]
-            temp_data_case.append(cars_list[i].class_label)
-            if cba_cb_m1.is_satisfy(temp_data_case, cars_list[i]):
-                return i
-    return None
-
-
-# compare two rule, return the precedence.
-#   -1: rule1 < rule2, 0: rule1 < rule2 (randomly here), 1: rule1 > rule2
-def compare(rule1, rule2):
-    if rule1 is None and rule2 is not None:
-        return -1
-    elif rule1 is None and rule2 is None:
-        return 0
-    elif rule1 is not None and rule2 is None:
-        return 1
-
-    if rule1.confidence < rule2.confidence:     # 1. the confidence of ri > rj
-        return -1
-    elif rule1.confidence == rule2.confidence:
-        if rule1.support < rule2.support:       # 2. their confidences are the same, but support of ri > rj
-            return -1
-        elif rule1.support == rule2.support:
-            if len(rule1.cond_set) < len(rule2.cond_set):   # 3. confidence & support are the same, ri earlier than rj
-                return 1
-            elif len(rule1.cond_set) == len(rule2.cond_set):
-                return 0
-            else:
-                return -1
-        else:
-            return 1
-    else:
+        if not c_rule_unknown and not w_rule_unknown:
+            break
+        covered = vertical_dataset.cover(cars_list[i].cond_set)
+        same_class = vertical_dataset.class_bitsets.get(cars_list[i].class_label, 0)
+        correct = covered & same_class & c_rule_unknown
+        if correct:
+            for case_index in vertical.bitset_to_indices(correct):
+                c_rule_indexes[case_index] = i
+            c_rule_unknown ^= correct
+        wrong = covered & ~same_class & w_rule_unknown
+        if wrong:
+            for case_index in vertical.bitset_to_indices(wrong):
+                w_rule_indexes[case_index] = i
+            w_rule_unknown ^= wrong
+    return c_rule_indexes, w_rule_indexes
+
+
+# compare the precedence of two rules by their ranks, i.e. their indexes in the rule list sorted by cba_cb_m1.sort, where
+#   None means no rule.
+#   -1: rule1 < rule2, 0: both are None, 1: rule1 > rule2
+def compare(rank1, rank2):
+    if rank1 is None:
+        return 0 if rank2 is None else -1
+    if rank2 is None or rank1 < rank2:
         return 1
+    return -1 if rank1 > rank2 else 0
 
 
 # finds all the rules in u that wrongly classify the data case and have higher precedences than that of its cRule.
-def allCoverRules(u, data_case, c_rule, cars_list):
+def allCoverRules(u, data_case, c_rule_index, cars_list):
     w_set = set()
     for rule_index in u:
         # have higher precedences than cRule
-        if compare(cars_list[rule_index], c_rule) > 0:
+        if compare(rule_index, c_rule_index) > 0:
             # wrongly classify the data case
             if cba_cb_m1.is_satisfy(data_case, cars_list[rule_index]) == False:
                 w_set.add(rule_index)
     return w_set
 
 
-# counts the number of training cases in each class
-def compClassDistr(dataset):
+# counts the number of training cases in each class, among the cases in bitset remaining (see vertical.py)
+# Return value: a dict {class label: number of cases}, or None if no case remains
+def compClassDistr(remaining, vertical_dataset):
+    if not remaining:
+        return None
     class_distr = dict()
-
-    if len(dataset) <= 0:
-        class_distr = None
-
-    dataset_without_null = dataset
-    while [] in dataset_without_null:
-        dataset_without_null.remove([])
-
-    class_column = [x[-1] for x in dataset_without_null]
-    class_label = set(class_column)
-    for c in class_label:
-        class_distr[c] = class_column.count(c)
+    for label, bitset in vertical_dataset.class_bitsets.items():
+        class_distr[label] = vertical.popcount(remaining & bitset)
     return class_distr
 
 
-# sort the rule list order by precedence
-def sort_with_index(q, cars_list):
-    def cmp_method(a, b):
-        # 1. the confidence of ri > rj
-        if cars_list[a].confidence < cars_list[b].confidence:
-            return 1
-        elif cars_list[a].confidence == cars_list[b].confidence:
-            # 2. their confidences are the same, but support of ri > rj
-            if cars_list[a].support < cars_list[b].support:
-                return 1
-            elif cars_list[a].support == cars_list[b].support:
-                # 3. both confidence & support are the same, ri earlier than rj
-                if len(cars_list[a].cond_set) < len(cars_list[b].cond_set):
-                    return -1
-                elif len(cars_list[a].cond_set) == len(cars_list[b].cond_set):
-                    return 0
-                else:
-                    return 1
-            else:
-                return -1
-        else:
-            return -1
-
-    rule_list = list(q)
-    rule_list.sort(key=cmp_to_key(cmp_method))
-    return set(rule_list)
+# get how many errors the rule makes in the cases of bitset covered, i.e. the cases not in its class
+def errorsOfRule(rule, covered, vertical_dataset):
+    correct = covered & vertical_dataset.class_bitsets.get(rule.class_label, 0)
+    return vertical.popcount(covered) - vertical.popcount(correct)
 
 
-# get how many errors the rule wrongly classify the data case
-def errorsOfRule(rule, dataset):
-    error_number = 0
-    for case in dataset:
-        if case:
-            if cba_cb_m1.is_satisfy(case, rule) == False:
-                error_number += 1
-    return error_number
+# remove the cases of bitset covered from class_distribution, which counts the cases of bitset remaining. Only the
+#   cases newly covered are visited, instead of counting the remaining dataset again.
+# Return value: the class distribution of the remaining cases, None if no case remains (see compClassDistr)
+def updateClassDistr(class_distribution, covered, remaining, vertical_dataset):
+    if not remaining:
+        return None
+    for label, bitset in vertical_dataset.class_bitsets.items():
+        class_distribution[label] -= vertical.popcount(covered & bitset)
+    return class_distribution
 
 
 # choose the default class (majority class in remaining dataset)
@@ -202,7 +178,6 @@ def selectDefault(class_distribution):
 # count the number of errors that the default class will make in the remaining training data
 def defErr(default_class, class_distribution):
     if class_distribution is None:
-        import sys
         return sys.maxsize
 
     error = 0
@@ -213,45 +188,48 @@ def defErr(default_class, class_distribution):
 
 
 # main method, implement the whole classifier builder
+# dataset: a list of data cases, or an EncodedDataset (see encoded.py)
 def classifier_builder_m2(cars, dataset):
     classifier = Classifier_m2()
+    vertical_dataset = vertical.VerticalDataset(dataset)
 
     cars_list = cba_cb_m1.sort(cars)
+    # the class labels of dataset, and those only appearing in rules
+    class_index = dict((label, i) for i, label in enumerate(vertical_dataset.class_bitsets))
+    for rule_item in cars_list:
+        class_index.setdefault(rule_item.class_label, len(class_index))
     for i in range(len(cars_list)):
-        cars_list[i] = ruleitem2rule(cars_list[i], dataset)
+        cars_list[i] = ruleitem2rule(cars_list[i], class_index)
+    case_classes = [class_index[case[-1]] for case in dataset]
 
     # stage 1
     q = set()
     u = set()
-    a = set()
+    a = list()
     mark_set = set()
+    c_rule_indexes, w_rule_indexes = maxCoverRules(cars_list, vertical_dataset)
     for i in range(len(dataset)):
-        c_rule_index = maxCoverRule_correct(cars_list, dataset[i])
-        w_rule_index = maxCoverRule_wrong(cars_list, dataset[i])
+        c_rule_index = c_rule_indexes[i]
+        w_rule_index = w_rule_indexes[i]
         if c_rule_index is not None:
             u.add(c_rule_index)
-        if c_rule_index:
-            cars_list[c_rule_index].classCasesCovered[dataset[i][-1]] += 1
-        if c_rule_index and w_rule_index:
-            if compare(cars_list[c_rule_index], cars_list[w_rule_index]) > 0:
+            cars_list[c_rule_index].classCasesCovered[case_classes[i]] += 1
+            if w_rule_index is None or compare(c_rule_index, w_rule_index) > 0:
                 q.add(c_rule_index)
                 mark_set.add(c_rule_index)
             else:
-                a.add((i, dataset[i][-1], c_rule_index, w_rule_index))
-        elif c_rule_index is None and w_rule_index is not None:
-            a.add((i, dataset[i][-1], c_rule_index, w_rule_index))
+                a.append((i, case_classes[i], c_rule_index, w_rule_index))
+        elif w_rule_index is not None:
+            a.append((i, case_classes[i], c_rule_index, w_rule_index))
 
     # stage 2
     for entry in a:
-        if cars_list[entry[3]] in mark_set:
+        if entry[3] in mark_set:
             if entry[2] is not None:
                 cars_list[entry[2]].classCasesCovered[entry[1]] -= 1
             cars_list[entry[3]].classCasesCovered[entry[1]] += 1
         else:
-            if entry[2] is not None:
-                w_set = allCoverRules(u, dataset[entry[0]], cars_list[entry[2]], cars_list)
-            else:
-                w_set = allCoverRules(u, dataset[entry[0]], None, cars_list)
+            w_set = allCoverRules(u, dataset[entry[0]], entry[2], cars_list)
             for w in w_set:
                 cars_list[w].replace.add((entry[2], entry[0], entry[1]))
                 cars_list[w].classCasesCovered[entry[1]] += 1
@@ -259,25 +237,26 @@ def classifier_builder_m2(cars, dataset):
 
     # stage 3
     rule_errors = 0
-    q = sort_with_index(q, cars_list)
-    data_cases_covered = list([False] * len(dataset))
+    q = sorted(q)       # rule indexes are precedence ranks, see cba_cb_m1.sort
+    remaining = vertical_dataset.all_rows
+    # is_covered[i] tells whether the i-th case is covered, i.e. not in remaining
+    is_covered = bytearray(len(vertical_dataset))
+    class_distribution = compClassDistr(remaining, vertical_dataset)
     for r_index in q:
-        if cars_list[r_index].classCasesCovered[cars_list[r_index].class_label] != 0:
+        if cars_list[r_index].classCasesCovered[cars_list[r_index].class_code] != 0:
             for entry in cars_list[r_index].replace:
-                if data_cases_covered[entry[1]]:
+                if is_covered[entry[1]]:
                     cars_list[r_index].classCasesCovered[entry[2]] -= 1
                 else:
                     if entry[0] is not None:
                         cars_list[entry[0]].classCasesCovered[entry[2]] -= 1
-            for i in range(len(dataset)):
-                datacase = dataset[i]
-                if datacase:
-                    is_satisfy_value = cba_cb_m1.is_satisfy(datacase, cars_list[r_index])
-                    if is_satisfy_value:
-                        dataset[i] = []
-                        data_cases_covered[i] = True
-            rule_errors += errorsOfRule(cars_list[r_index], dataset)
-            class_distribution = compClassDistr(dataset)
+            # every case the rule covers is removed, whether the rule classifies it correctly or not, as in the paper
+            covered = vertical_dataset.cover(cars_list[r_index].cond_set) & remaining
+            remaining ^= covered
+            for case_index in vertical.bitset_to_indices(covered):
+                is_covered[case_index] = 1
+            rule_errors += errorsOfRule(cars_list[r_index], covered, vertical_dataset)
+            class_distribution = updateClassDistr(class_distribution, covered, remaining, vertical_dataset)
             default_class = selectDefault(class_distribution)
             default_errors = defErr(default_class, class_distribution)
             total_errors = rule_errors + default_errors
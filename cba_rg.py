@@ -1,39 +1,98 @@
 """
 Description: The implementation of CBA-RG algorithm, generating the complete set of CARs (Class Association Rules).
     We just follow up algorithm raised up in the paper without improvement.
-Input: a dataset got from pre_process (see pre_processing.py), minsup and minconf
+Input: a dataset got from pre_process (see pre_processing.py) or its EncodedDataset (see encoded.py), minsup and
+    minconf, which counting engine to use, and the limits of mining (see MiningConfig)
 Output: CARs
 Author: CBA Studio
 Reference: https://www.cs.uic.edu/~hxiao/courses/cs594-slides.pdf
 """
+import encoded
 import ruleitem
+import vertical
+import collections
+import multiprocessing
+import sys
+import time
+
+
+class MiningConfig:
+    """
+    The limits of rule generation. Every limit is None by default, which means no limit, so mining goes on until there
+    is no frequent ruleitem any more. When a limit is hit, mining stops and the name of the limit is recorded in
+    Car.stop_reason, while all the rules found before are kept.
+    max_rules: stop when the number of CARs exceeds it.
+    max_candidates: the most candidates counted in one level, the rest are dropped and mining stops after this level.
+    max_length: the longest condset to mine.
+    memory_budget: the most memory (in bytes) taken by the CARs and the candidates of the current level, measured by
+        get_memory_size. Mining stops before counting a level which is expected to exceed it.
+    time_budget: the most wall-clock time (in seconds) spent on mining.
+    min_new_rules: stop when a level adds fewer new CARs than it (the heuristic of the former CBA-RG, which is 10).
+    """
+    def __init__(self, max_rules=None, max_candidates=None, max_length=None, memory_budget=None, time_budget=None,
+                 min_new_rules=None):
+        self.max_rules = max_rules
+        self.max_candidates = max_candidates
+        self.max_length = max_length
+        self.memory_budget = memory_budget
+        self.time_budget = time_budget
+        self.min_new_rules = min_new_rules
+
+    # get the deadline of mining started at start_time, None if no time budget
+    def get_deadline(self, start_time):
+        if self.time_budget is None:
+            return None
+        return start_time + self.time_budget
+
+    # check the limits which are not about a single level, return the name of the first limit hit, or None
+    def check(self, deadline, rules_number, memory_size):
+        if self.max_rules is not None and rules_number > self.max_rules:
+            return 'max_rules'
+        if self.memory_budget is not None and memory_size > self.memory_budget:
+            return 'memory_budget'
+        if deadline is not None and time.time() > deadline:
+            return 'time_budget'
+        return None
+
+
+# measure the memory (in bytes) taken by ruleitems, including their cond_sets and the numbers in their fields
+def get_memory_size(rule_items):
+    size = 0
+    for item in rule_items:
+        size += sys.getsizeof(item) + sys.getsizeof(item.cond_set) + sys.getsizeof(item.support) + \
+            sys.getsizeof(item.confidence)
+        for pair in item.cond_set:
+            size += sys.getsizeof(pair)
+    return size
 
 
 class FrequentRuleitems:
     """
-    A set of frequent k-ruleitems, just using set.
+    A set of frequent k-ruleitems, indexed by a dict with following fashion:
+            {(canonical cond_set, class label): ruleitem, ...}
+    so that checking whether a ruleitem is already in the set is O(1).
     """
     def __init__(self):
-        self.frequent_ruleitems_set = set()
+        self.frequent_ruleitems = dict()
+
+    # all frequent ruleitems in the set
+    @property
+    def frequent_ruleitems_set(self):
+        return self.frequent_ruleitems.values()
 
     # get size of set
     def get_size(self):
-        return len(self.frequent_ruleitems_set)
+        return len(self.frequent_ruleitems)
 
     # add a new ruleitem into set
     def add(self, rule_item):
-        is_existed = False
-        for item in self.frequent_ruleitems_set:
-            if item.class_label == rule_item.class_label:
-                if item.cond_set == rule_item.cond_set:
-                    is_existed = True
-                    break
-        if not is_existed:
-            self.frequent_ruleitems_set.add(rule_item)
+        key = (rule_item.cond_set, rule_item.class_label)
+        if key not in self.frequent_ruleitems:
+            self.frequent_ruleitems[key] = rule_item
 
     # append set of ruleitems
     def append(self, sets):
-        for item in sets.frequent_ruleitems:
+        for item in sets.frequent_ruleitems_set:
             self.add(item)
 
     # print out all frequent ruleitems
@@ -45,12 +104,35 @@ class FrequentRuleitems:
 class Car:
     """
     Class Association Rules (Car). If some ruleitems has the same condset, the ruleitem with the highest confidence is
-    chosen as the Possible Rule (PR). If there're more than one ruleitem with the same highest confidence, we randomly
-    select one ruleitem.
+    chosen as the Possible Rule (PR). If there're more than one ruleitem with the same highest confidence, we select the
+    one whose class label comes first, so that the result doesn't depend on the order the ruleitems are added in.
     """
     def __init__(self):
-        self.rules = set()
-        self.pruned_rules = set()
+        self._rules = dict()            # {canonical cond_set: rule}, only one rule for each condset
+        self._pruned_rules = dict()     # {(canonical cond_set, class label): rule}
+        self.stop_reason = None         # the limit of MiningConfig hit when generating rules, None if not any
+
+    # all rules, can be reassigned by any collection of ruleitems (e.g. cars.rules = cars.pruned_rules)
+    @property
+    def rules(self):
+        return self._rules.values()
+
+    @rules.setter
+    def rules(self, rules):
+        self._rules = dict()
+        for rule in rules:
+            self._rules[rule.cond_set] = rule
+
+    # all rules after pruning
+    @property
+    def pruned_rules(self):
+        return self._pruned_rules.values()
+
+    @pruned_rules.setter
+    def pruned_rules(self, rules):
+        self._pruned_rules = dict()
+        for rule in rules:
+            self._pruned_rules[(rule.cond_set, rule.class_label)] = rule
 
     # print out all rules
     def print_rule(self):
@@ -65,36 +147,39 @@ class Car:
     # add a new rule (frequent & accurate), save the ruleitem with the highest confidence when having the same condset
     def _add(self, rule_item, minsup, minconf):
         if rule_item.support >= minsup and rule_item.confidence >= minconf:
-            if rule_item in self.rules:
-                return
-            for item in self.rules:
-                if item.cond_set == rule_item.cond_set and item.confidence < rule_item.confidence:
-                    self.rules.remove(item)
-                    self.rules.add(rule_item)
-                    return
-                elif item.cond_set == rule_item.cond_set and item.confidence >= rule_item.confidence:
-                    return
-            self.rules.add(rule_item)
+            key = rule_item.cond_set
+            item = self._rules.get(key)
+            if item is None or item.confidence < rule_item.confidence or \
+                    (item.confidence == rule_item.confidence and repr(rule_item.class_label) < repr(item.class_label)):
+                self._rules[key] = rule_item
 
     # convert frequent ruleitems into car
     def gen_rules(self, frequent_ruleitems, minsup, minconf):
         for item in frequent_ruleitems.frequent_ruleitems_set:
             self._add(item, minsup, minconf)
 
-    # prune rules
-    def prune_rules(self, dataset):
-        for rule in self.rules:
-            pruned_rule = prune(rule, dataset)
-
-            is_existed = False
-            for rule in self.pruned_rules:
-                if rule.class_label == pruned_rule.class_label:
-                    if rule.cond_set == pruned_rule.cond_set:
-                        is_existed = True
-                        break
+    # prune rules, the sub-rules evaluated are cached (at most cache_size of them) and shared by all rules
+    # processes: the number of worker processes pruning rules in parallel, each of them has its own cache. The pruned
+    #   rules are merged in the original order, so they are the same as pruning serially. None or 1 means pruning in
+    #   this process.
+    def prune_rules(self, dataset, cache_size=100000, processes=None):
+        if not isinstance(dataset, vertical.VerticalDataset):
+            dataset = vertical.VerticalDataset(dataset)
+        if processes is None or processes <= 1:
+            cache = LRUCache(cache_size)
+            pruned_rules = (prune(rule, dataset, cache) for rule in self.rules)
+            self._add_pruned_rules(pruned_rules)
+        else:
+            with multiprocessing.Pool(processes, initializer=_init_prune_worker,
+                                      initargs=(dataset, cache_size)) as pool:
+                self._add_pruned_rules(pool.imap(_prune_rule, list(self.rules), chunksize=64))
 
-            if not is_existed:
-                self.pruned_rules.add(pruned_rule)
+    # add pruned rules into pruned_rules, skipping those already existing
+    def _add_pruned_rules(self, pruned_rules):
+        for pruned_rule in pruned_rules:
+            key = (pruned_rule.cond_set, pruned_rule.class_label)
+            if key not in self._pruned_rules:
+                self._pruned_rules[key] = pruned_rule
 
     # union new car into rules list
     def append(self, car, minsup, minconf):
@@ -102,38 +187,63 @@ class Car:
             self._add(item, minsup, minconf)
 
 
+class LRUCache:
+    """
+    A dict holding at most max_size entries. When it's full, the least recently used entry is evicted.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+
+    # get the value of key, None if not cached
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    # cache the value of key
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
 # try to prune rule
-def prune(rule, dataset):
-    import sys
+# cache: a LRUCache shared by the rules pruned on the same dataset, with following fashion:
+#       {(cond_set, class label): (rule, errors of rule), ...}
+#   so that every sub-rule is counted only once
+def prune(rule, dataset, cache=None):
     min_rule_error = sys.maxsize
     pruned_rule = rule
 
+    # get the rule <cond_set, class label of rule> and how many errors it makes in the dataset, i.e. the number of data
+    #   cases satisfying cond_set but belonging to another class
+    def evaluate(cond_set):
+        key = (cond_set, rule.class_label)
+        entry = cache.get(key) if cache is not None else None
+        if entry is None:
+            temp_rule = ruleitem.RuleItem(cond_set, rule.class_label, dataset)
+            entry = (temp_rule, temp_rule.cond_sup_count - temp_rule.rule_sup_count)
+            if cache is not None:
+                cache.put(key, entry)
+        return entry
+
     # prune rule recursively
     def find_prune_rule(this_rule):
         nonlocal min_rule_error
         nonlocal pruned_rule
 
-        # calculate how many errors the rule r make in the dataset
-        def errors_of_rule(r):
-            import cba_cb_m1
-
-            errors_number = 0
-            for case in dataset:
-                if cba_cb_m1.is_satisfy(case, r) == False:
-                    errors_number += 1
-            return errors_number
-
-        rule_error = errors_of_rule(this_rule)
+        rule_error = evaluate(this_rule.cond_set)[1]
         if rule_error < min_rule_error:
             min_rule_error = rule_error
             pruned_rule = this_rule
-        this_rule_cond_set = list(this_rule.cond_set)
+        this_rule_cond_set = this_rule.cond_set
         if len(this_rule_cond_set) >= 2:
-            for attribute in this_rule_cond_set:
-                temp_cond_set = dict(this_rule.cond_set)
-                temp_cond_set.pop(attribute)
-                temp_rule = ruleitem.RuleItem(temp_cond_set, this_rule.class_label, dataset)
-                temp_rule_error = errors_of_rule(temp_rule)
+            for i in range(len(this_rule_cond_set)):
+                temp_cond_set = this_rule_cond_set[:i] + this_rule_cond_set[i+1:]
+                temp_rule, temp_rule_error = evaluate(temp_cond_set)
                 if temp_rule_error <= min_rule_error:
                     min_rule_error = temp_rule_error
                     pruned_rule = temp_rule
@@ -144,65 +254,189 @@ def prune(rule, dataset):
     return pruned_rule
 
 
-# invoked by candidate_gen, join two items to generate candidate
-def join(item1, item2, dataset):
-    if item1.class_label != item2.class_label:
+# invoked by candidate_gen, join two k-ruleitems sharing the same (k-1)-prefix and class label, whose canonical
+#   cond_sets are key1 < key2. Return the canonical cond_set of the (k+1)-candidate, or None when the last items of them
+#   are about the same attribute (a condset can't contain two values of one attribute)
+def join(key1, key2):
+    if key1[-1][0] == key2[-1][0]:
         return None
-    category1 = set(item1.cond_set)
-    category2 = set(item2.cond_set)
-    if category1 == category2:
-        return None
-    intersect = category1 & category2
-    for item in intersect:
-        if item1.cond_set[item] != item2.cond_set[item]:
-            return None
-    category = category1 | category2
-    new_cond_set = dict()
-    for item in category:
-        if item in category1:
-            new_cond_set[item] = item1.cond_set[item]
-        else:
-            new_cond_set[item] = item2.cond_set[item]
-    new_ruleitem = ruleitem.RuleItem(new_cond_set, item1.class_label, dataset)
-    return new_ruleitem
+    return key1 + key2[-1:]
 
 
-# similar to Apriori-gen in algorithm Apriori
-def candidate_gen(frequent_ruleitems, dataset):
+# check whether any k-subset of the canonical (k+1)-cond_set new_key is not frequent for class_label. The two subsets
+#   without one of the last two items are the joined ruleitems themselves, so they are not checked again
+def has_infrequent_subset(new_key, class_label, frequent_ruleitems):
+    for i in range(len(new_key) - 2):
+        subset_key = new_key[:i] + new_key[i+1:]
+        if (subset_key, class_label) not in frequent_ruleitems.frequent_ruleitems:
+            return True
+    return False
+
+
+# Apriori-gen in algorithm Apriori: join the frequent k-ruleitems with the same class label and the same first k-1
+#   items (in canonical order), and discard candidates having an infrequent k-subset. Return a dict with following
+#   fashion:
+#       {canonical cond_set: [class label, ...], ...}
+#   so a condset which is a candidate for several class labels is counted only once (see count_candidates).
+def gen_candidate_keys(frequent_ruleitems):
+    groups = dict()     # {(class label, (k-1)-prefix): [canonical cond_set, ...]}
+    for key, class_label in frequent_ruleitems.frequent_ruleitems:
+        groups.setdefault((class_label, key[:-1]), []).append(key)
+
+    candidates = dict()
+    for (class_label, prefix), keys in groups.items():
+        keys.sort()
+        for i in range(len(keys)):
+            for j in range(i + 1, len(keys)):
+                new_key = join(keys[i], keys[j])
+                if new_key is None or has_infrequent_subset(new_key, class_label, frequent_ruleitems):
+                    continue
+                candidates.setdefault(new_key, []).append(class_label)
+    return candidates
+
+
+# the dataset used in a worker process, see count_candidates and prune_rules
+_worker_dataset = None
+
+
+# initializer of worker processes, keep the dataset in the process, so that it's sent once for each process instead of
+#   once for each task
+def _init_worker(dataset):
+    global _worker_dataset
+    _worker_dataset = dataset
+
+
+# count the class histogram of a canonical cond_set in a worker process
+def _count_key(key):
+    return ruleitem.get_class_histogram(key, _worker_dataset)
+
+
+# the cache of sub-rules used by prune in a worker process, see prune_rules
+_worker_cache = None
+
+
+# initializer of worker processes pruning rules, keep the dataset and a cache in the process
+def _init_prune_worker(dataset, cache_size):
+    global _worker_dataset, _worker_cache
+    _worker_dataset = dataset
+    _worker_cache = LRUCache(cache_size)
+
+
+# prune a rule in a worker process
+def _prune_rule(rule):
+    return prune(rule, _worker_dataset, _worker_cache)
+
+
+# count the support of the candidates got from gen_candidate_keys, return them as ruleitems. Stop counting when the
+#   deadline (if any) has passed.
+# pool: a process pool initialized with _init_worker, if given, the candidates are sent in chunks to the worker
+#   processes, and the results are merged in the original order, so they are the same as counting serially.
+def count_candidates(candidates, dataset, deadline=None, pool=None):
+    keys = list(candidates)
+    if pool is None:
+        results = (ruleitem.get_class_histogram(key, dataset) for key in keys)
+    else:
+        results = pool.imap(_count_key, keys, chunksize=256)
+    histograms = []
+    for counted, result in enumerate(results):
+        if deadline is not None and counted % 1000 == 0 and time.time() > deadline:
+            break
+        histograms.append(result)
+
     returned_frequent_ruleitems = FrequentRuleitems()
-    for item1 in frequent_ruleitems.frequent_ruleitems_set:
-        for item2 in frequent_ruleitems.frequent_ruleitems_set:
-            new_ruleitem = join(item1, item2, dataset)
-            if new_ruleitem:
-                returned_frequent_ruleitems.add(new_ruleitem)
-                if returned_frequent_ruleitems.get_size() >= 1000:      # not allow to store more than 1000 ruleitems
-                    return returned_frequent_ruleitems
+    for new_key, (cond_sup_count, histogram) in zip(keys, histograms):
+        for class_label in candidates[new_key]:
+            new_ruleitem = ruleitem.RuleItem.from_counts(new_key, class_label, cond_sup_count,
+                                                         histogram.get(class_label, 0), len(dataset))
+            returned_frequent_ruleitems.add(new_ruleitem)
     return returned_frequent_ruleitems
 
 
+# similar to Apriori-gen in algorithm Apriori, generate and count the candidates of the next level
+def candidate_gen(frequent_ruleitems, dataset):
+    return count_candidates(gen_candidate_keys(frequent_ruleitems), dataset)
+
+
 # main method, implementation of CBA-RG algorithm
-def rule_generator(dataset, minsup, minconf):
+# engine: how to count the support of ruleitems, the results are the same
+#   'vertical': intersect the bitsets of items (see vertical.py), the default one
+#   'horizontal': scan the whole dataset for every ruleitem
+#   'fp-growth': mine with a class-aware FP-tree instead of level by level (see fp_growth.py), about as fast as
+#       'vertical' (faster on some datasets, slower on others)
+# config: the limits of mining, see MiningConfig. No limit by default, which may give millions of CARs at a low minsup,
+#   so pass MiningConfig(max_rules=2000, min_new_rules=10) for the limits of the former CBA-RG (as validation.py does)
+# processes: the number of worker processes counting the support of candidates in parallel, the rules are the same as
+#   the serial one. None or 1 means counting in this process. It has no effect on 'fp-growth'.
+def rule_generator(dataset, minsup, minconf, engine='vertical', config=None, processes=None):
+    if config is None:
+        config = MiningConfig()
+
+    if engine == 'fp-growth':
+        import fp_growth
+        return fp_growth.rule_generator(dataset, minsup, minconf, config)
+    elif engine == 'vertical':
+        counting_dataset = vertical.VerticalDataset(dataset)
+    elif engine == 'horizontal':
+        counting_dataset = dataset
+    else:
+        raise ValueError("unknown engine: %s" % engine)
+
+    if processes is None or processes <= 1:
+        return apriori(dataset, counting_dataset, minsup, minconf, config)
+    with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(counting_dataset,)) as pool:
+        return apriori(dataset, counting_dataset, minsup, minconf, config, pool)
+
+
+# level-wise search of CBA-RG, count the support of ruleitems with counting_dataset (the dataset itself or its
+#   VerticalDataset), in the process pool if given (see count_candidates)
+def apriori(dataset, counting_dataset, minsup, minconf, config, pool=None):
+    deadline = config.get_deadline(time.time())
     frequent_ruleitems = FrequentRuleitems()
-    car = Car()
 
     # get large 1-ruleitems and generate rules
-    class_label = set([x[-1] for x in dataset])
-    for column in range(0, len(dataset[0])-1):
-        distinct_value = set([x[column] for x in dataset])
+    if isinstance(dataset, encoded.EncodedDataset):
+        class_label = list(dataset.class_labels)
+        columns = [dataset.get_distinct_values(column) for column in range(dataset.get_column_number())]
+    else:
+        class_label = list(set([x[-1] for x in dataset]))
+        columns = [set([x[column] for x in dataset]) for column in range(0, len(dataset[0])-1)]
+    candidates = dict()
+    for column, distinct_value in enumerate(columns):
         for value in distinct_value:
-            cond_set = {column: value}
-            for classes in class_label:
-                rule_item = ruleitem.RuleItem(cond_set, classes, dataset)
-                if rule_item.support >= minsup:
-                    frequent_ruleitems.add(rule_item)
-    car.gen_rules(frequent_ruleitems, minsup, minconf)
-    cars = car
-
+            candidates[((column, value),)] = class_label
+    for rule_item in count_candidates(candidates, counting_dataset, pool=pool).frequent_ruleitems_set:
+        if rule_item.support >= minsup:
+            frequent_ruleitems.add(rule_item)
+    cars = Car()
+    cars.gen_rules(frequent_ruleitems, minsup, minconf)
+
+    length = 1
     last_cars_number = 0
     current_cars_number = len(cars.rules)
-    while frequent_ruleitems.get_size() > 0 and current_cars_number <= 2000 and \
-                    (current_cars_number - last_cars_number) >= 10:
-        candidate = candidate_gen(frequent_ruleitems, dataset)
+    rules_memory_size = get_memory_size(cars.rules) if config.memory_budget is not None else 0
+    while frequent_ruleitems.get_size() > 0:
+        cars.stop_reason = config.check(deadline, current_cars_number, rules_memory_size)
+        if cars.stop_reason is None and config.max_length is not None and length >= config.max_length:
+            cars.stop_reason = 'max_length'
+        if cars.stop_reason is None and config.min_new_rules is not None and \
+                current_cars_number - last_cars_number < config.min_new_rules:
+            cars.stop_reason = 'min_new_rules'
+        if cars.stop_reason is not None:
+            break
+
+        candidates = gen_candidate_keys(frequent_ruleitems)
+        if config.max_candidates is not None and len(candidates) > config.max_candidates:
+            candidates = dict(list(candidates.items())[:config.max_candidates])
+            cars.stop_reason = 'max_candidates'
+        if config.memory_budget is not None:
+            # estimate by the size of a ruleitem in this level, since candidates are one item longer
+            ruleitem_size = get_memory_size(frequent_ruleitems.frequent_ruleitems_set) / frequent_ruleitems.get_size()
+            candidates_number = sum(len(class_labels) for class_labels in candidates.values())
+            if rules_memory_size + ruleitem_size * candidates_number > config.memory_budget:
+                cars.stop_reason = 'memory_budget'
+                break
+
+        candidate = count_candidates(candidates, counting_dataset, deadline, pool)
         frequent_ruleitems = FrequentRuleitems()
         car = Car()
         for item in candidate.frequent_ruleitems_set:
@@ -210,8 +444,15 @@ def rule_generator(dataset, minsup, minconf):
                 frequent_ruleitems.add(item)
         car.gen_rules(frequent_ruleitems, minsup, minconf)
         cars.append(car, minsup, minconf)
+        length += 1
         last_cars_number = current_cars_number
         current_cars_number = len(cars.rules)
+        rules_memory_size = get_memory_size(cars.rules) if config.memory_budget is not None else 0
+
+        if deadline is not None and time.time() > deadline:
+            cars.stop_reason = 'time_budget'
+        if cars.stop_reason is not None:
+            break
 
     return cars
 
@@ -0,0 +1,175 @@
+"""
+Description: Columnar, integer-encoded representation of a dataset got from pre_process. The attributes are stored in a
+    NumPy matrix with the smallest integer dtype fitting all values, and the class labels in a vector of class codes, so
+    a table of 1M rows and 40 attributes takes about 40 MB instead of gigabytes of Python lists. The rows covered by a
+    condset and the class counts of a set of rows are computed by vectorized operations instead of Python loops.
+Input: a dataset got from pre_process (see pre_processing.py), i.e. a list of data cases whose last element is the
+    class label. The attributes are integers, except the columns left as they are by pre_process (e.g. those not typed
+    in the *.names file), which are encoded into integers here.
+Output: an EncodedDataset, which can be used in place of the dataset by the rule generator (see cba_rg.py), both
+    classifier builders (see cba_cb_m1.py and cba_cb_m2.py) and evaluation (see validation.py).
+Author: CBA Studio
+"""
+import numpy as np
+
+
+# get the smallest integer dtype holding all values in [low, high]
+def smallest_int_dtype(low, high):
+    for dtype in (np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return np.int64
+
+
+class EncodedDataset:
+    """
+    matrix: a NumPy matrix, matrix[i][j] is the value of the j-th attribute of the i-th data case.
+    classes: a NumPy vector, classes[i] is the code of the class label of the i-th data case.
+    class_labels: a list of class labels, class_labels[code] is the class label of code.
+    value_codes: a dict {column: {value: code}}, for the columns whose values aren't integers, which are stored in
+        matrix as their codes, numbered from 1 like categorical columns (see replace_categorical in pre_processing.py).
+        Rules mined from the dataset use the codes of these columns.
+    It behaves like the list of data cases as well: len(), iteration, indexing (a data case is returned as a list with
+    the class label at the end), slicing and + (both return an EncodedDataset sharing class_labels and value_codes).
+    """
+    def __init__(self, dataset):
+        class_labels = list()
+        class_index = dict()
+        for case in dataset:
+            if case[-1] not in class_index:
+                class_index[case[-1]] = len(class_labels)
+                class_labels.append(case[-1])
+        columns = len(dataset[0]) - 1 if dataset else 0
+        values = np.array([case[:-1] for case in dataset]).reshape(len(dataset), columns)
+        value_codes = dict()
+        if values.size == 0:
+            values = values.astype(np.uint8)
+        else:
+            if values.dtype.kind not in 'iu':
+                values, value_codes = encode_columns(dataset, columns)
+            values = values.astype(smallest_int_dtype(values.min(), values.max()))
+        self.matrix = values
+        self.classes = np.array([class_index[case[-1]] for case in dataset],
+                                dtype=smallest_int_dtype(0, len(class_labels)))
+        self.class_labels = class_labels
+        self.value_codes = value_codes
+
+    # build an EncodedDataset from its arrays directly
+    @classmethod
+    def from_arrays(cls, matrix, classes, class_labels, value_codes=None):
+        encoded_dataset = cls.__new__(cls)
+        encoded_dataset.matrix = matrix
+        encoded_dataset.classes = classes
+        encoded_dataset.class_labels = class_labels
+        encoded_dataset.value_codes = dict() if value_codes is None else value_codes
+        return encoded_dataset
+
+    def __len__(self):
+        return len(self.classes)
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self.matrix[index].tolist() + [self.class_labels[self.classes[index]]]
+        return EncodedDataset.from_arrays(self.matrix[index], self.classes[index], self.class_labels,
+                                          self.value_codes)
+
+    def __iter__(self):
+        for values, code in zip(self.matrix.tolist(), self.classes.tolist()):
+            values.append(self.class_labels[code])
+            yield values
+
+    def __add__(self, other):
+        if other.class_labels != self.class_labels or other.value_codes != self.value_codes:
+            raise ValueError("can't concatenate datasets with different class labels or value codes")
+        return EncodedDataset.from_arrays(np.concatenate((self.matrix, other.matrix)),
+                                          np.concatenate((self.classes, other.classes)), self.class_labels,
+                                          self.value_codes)
+
+    # get the number of attributes (the class label is not included)
+    def get_column_number(self):
+        return self.matrix.shape[1]
+
+    # get distinct values of the column in ascending order
+    def get_distinct_values(self, column):
+        return np.unique(self.matrix[:, column]).tolist()
+
+    # convert into a list of data cases, the same as the dataset got from pre_process
+    def to_list(self):
+        return list(self)
+
+    # get the boolean mask of data cases whose LHS satisfy the cond_set, a tuple of (item name, value)
+    def rows_matching(self, cond_set):
+        mask = np.ones(len(self), dtype=bool)
+        for item, value in cond_set:
+            mask &= self.matrix[:, item] == value
+        return mask
+
+    # count the data cases in each class among the rows selected by mask (all rows if None), return a dict
+    #   {class label: count}
+    def class_counts(self, mask=None):
+        classes = self.classes if mask is None else self.classes[mask]
+        counts = np.bincount(classes, minlength=len(self.class_labels))
+        return dict(zip(self.class_labels, counts.tolist()))
+
+    # calculate condsupCount and rulesupCount of the ruleitem <cond_set, class_label>, see RuleItem in ruleitem.py
+    def get_sup_count(self, cond_set, class_label):
+        cond_sup_count, histogram = self.get_class_histogram(cond_set)
+        return cond_sup_count, histogram.get(class_label, 0)
+
+    # calculate condsupCount of cond_set and rulesupCount of every class label, see get_class_histogram in ruleitem.py
+    def get_class_histogram(self, cond_set):
+        mask = self.rows_matching(cond_set)
+        return int(mask.sum()), self.class_counts(mask)
+
+    # get the bitsets of items and class labels, as VerticalDataset uses (see vertical.py), return a tuple of dicts
+    #   ({(item name, value): bitset}, {class label: bitset})
+    def to_bitsets(self):
+        item_bitsets = dict()
+        for column in range(self.get_column_number()):
+            column_data = self.matrix[:, column]
+            for value in self.get_distinct_values(column):
+                item_bitsets[(column, value)] = mask_to_bitset(column_data == value)
+        class_bitsets = dict()
+        for code, label in enumerate(self.class_labels):
+            class_bitsets[label] = mask_to_bitset(self.classes == code)
+        return item_bitsets, class_bitsets
+
+
+# encode the attributes of dataset column by column, the values of a column which aren't all integers are replaced by
+#   their codes, i.e. 1, 2, ... in the order of first appearance
+# Returned value: the matrix of integers, and the dict {column: {value: code}} of the encoded columns
+def encode_columns(dataset, columns):
+    encoded_columns = list()
+    value_codes = dict()
+    for column in range(columns):
+        column_data = [case[column] for case in dataset]
+        column_values = np.array(column_data)
+        if column_values.dtype.kind not in 'iu':
+            codes = dict()
+            for value in column_data:
+                if value not in codes:
+                    codes[value] = len(codes) + 1
+            column_values = np.array([codes[value] for value in column_data], dtype=np.int64)
+            value_codes[column] = codes
+        encoded_columns.append(column_values)
+    return np.column_stack(encoded_columns), value_codes
+
+
+# convert a boolean mask into a bitset (Python integer), whose i-th bit is mask[i]
+def mask_to_bitset(mask):
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+
+
+# just for test
+if __name__ == '__main__':
+    dataset = [[1, 1, 1], [1, 1, 1], [1, 2, 1], [2, 2, 1], [2, 2, 1],
+               [2, 2, 0], [2, 3, 0], [2, 3, 0], [1, 1, 0], [3, 2, 0]]
+    encoded_dataset = EncodedDataset(dataset)
+    print(encoded_dataset.matrix.dtype)                                 # should be uint8
+    print(encoded_dataset.get_sup_count(((0, 1), (1, 1)), 1))           # should be (3, 2)
+    print(encoded_dataset.get_class_histogram(((0, 1),)))               # should be (4, {1: 3, 0: 1})
+    print(encoded_dataset[2:4].to_list() + encoded_dataset[-1:].to_list())  # should be [[1, 2, 1], [2, 2, 1], [3, 2, 0]]
+    mixed_dataset = EncodedDataset([['b', 1, 1], ['a', 2, 0], ['b', 2, 0]])
+    print(mixed_dataset.to_list())                                      # should be [[1, 1, 1], [2, 2, 0], [1, 2, 0]]
+    print(mixed_dataset.value_codes)                                    # should be {0: {'b': 1, 'a': 2}}
@@ -0,0 +1,213 @@
+"""
+Description: A class-aware FP-growth miner, an alternative to the level-wise CBA-RG (see cba_rg.py). All data cases are
+    compressed into an FP-tree whose nodes keep one count for each class label, so the rulesupCount of every class is
+    known for any condset. Then the frequent ruleitems are found by recursively mining conditional FP-trees, which
+    needs only two passes over the dataset and no candidate generation. The trees are kept in NumPy arrays (see
+    FPTree), so counting and building them aren't loops over nodes in Python.
+Input: a dataset got from pre_process (see pre_processing.py), minsup, minconf and the limits of mining
+Output: CARs, the same Car object as cba_rg.rule_generator (see cba_rg.py)
+Author: CBA Studio
+Reference:
+    1. Han, J., Pei, J. & Yin, Y. "Mining Frequent Patterns without Candidate Generation." Proc of SIGMOD (2000): 1-12.
+    2. Li, W., Han, J. & Pei, J. "CMAR: Accurate and Efficient Classification Based on Multiple Class-Association
+       Rules." Proc of ICDM (2001): 369-376.
+"""
+import cba_rg
+import encoded
+import ruleitem
+import numpy as np
+import time
+
+
+# get the minimum rulesupCount meeting minsup, i.e. the smallest count with count / dataset_size >= minsup
+def get_min_count(minsup, dataset_size):
+    min_count = max(int(minsup * dataset_size), 0)
+    while min_count > 0 and (min_count - 1) / dataset_size >= minsup:
+        min_count -= 1
+    while min_count / dataset_size < minsup:
+        min_count += 1
+    return min_count
+
+
+class FPTree:
+    """
+    FP-tree with class counts, kept in array form instead of linked nodes. Each path from the root is a row of paths,
+    the ranks of its items in ascending order (i.e. by frequency descending) padded by pad at the end. The same paths
+    are merged into one row, as they are inserted into one branch of the tree, and the rows are in lexicographic order,
+    so the paths through a node (i.e. sharing a prefix) are adjacent. The class counts of all items are summed up by
+    NumPy over the rows, instead of walking the nodes one by one.
+    paths: a NumPy matrix of item ranks.
+    counts: a NumPy matrix, counts[i][j] is the number of data cases of the j-th class label with the i-th path.
+    pad: the rank padding paths, greater than the rank of any item.
+    item_counts: a NumPy matrix, item_counts[rank] is the class counts of the item with rank in this tree.
+    order: the ranks of the items frequent for at least one class label, in ascending order.
+    """
+    def __init__(self, paths, counts, pad, min_count, merge=True):
+        # count each item for each class, and keep the items frequent for at least one class label
+        item_counts = np.zeros((pad + 1, counts.shape[1]), dtype=np.int64)
+        flat_paths = paths.ravel()
+        for j in range(counts.shape[1]):
+            item_counts[:, j] = np.bincount(flat_paths, weights=np.repeat(counts[:, j], paths.shape[1]),
+                                            minlength=pad + 1)
+        self.item_counts = item_counts[:pad]
+        is_frequent = self.item_counts.max(axis=1) >= min_count
+        self.order = np.flatnonzero(is_frequent)
+        self.pad = pad
+        if not merge:
+            # the tree is only counted (e.g. the condsets extending it reach max_length), so its paths are not needed
+            self.paths = paths[:0]
+            self.counts = counts[:0]
+            return
+
+        # remove the infrequent items from paths, and then the empty paths
+        paths = np.sort(np.where(np.append(is_frequent, False)[paths], paths, pad), axis=1)
+        lengths = np.count_nonzero(paths != pad, axis=1)
+        is_kept = lengths > 0
+        paths = paths[is_kept, :lengths.max() if len(lengths) else 0]
+        counts = counts[is_kept]
+
+        # merge the same paths
+        if len(paths) > 1:
+            sorted_rows = np.lexsort(paths.T[::-1])
+            paths = paths[sorted_rows]
+            counts = counts[sorted_rows]
+            is_new = np.ones(len(paths), dtype=bool)
+            is_new[1:] = (paths[1:] != paths[:-1]).any(axis=1)
+            starts = np.flatnonzero(is_new)
+            paths = paths[starts]
+            counts = np.add.reduceat(counts, starts, axis=0)
+        self.paths = paths
+        self.counts = counts
+
+    # get the conditional pattern base of the item with rank: the prefixes of the paths through the item (only the items
+    #   before it), with the class counts of the paths
+    def get_conditional_base(self, rank):
+        rows, columns = np.nonzero(self.paths == rank)
+        width = int(columns.max()) if len(columns) else 0
+        prefixes = self.paths[rows, :width]
+        prefixes = np.where(np.arange(width) < columns[:, None], prefixes, self.pad)
+        return prefixes, self.counts[rows]
+
+
+class FPGrowth:
+    """
+    Mine the FP-tree recursively, and add the rules of every frequent condset into cars as soon as it is found.
+    class_labels: a list of class labels, the order of class counts in FPTree.
+    items: a list of items, items[rank] is the item with rank in FPTree.
+    min_count: the minimum rulesupCount meeting minsup.
+    config: the limits of mining (see MiningConfig in cba_rg.py). When a limit is hit, cars.stop_reason is set and no
+        more condsets are mined.
+    """
+    def __init__(self, class_labels, items, dataset_size, minsup, minconf, config):
+        self.class_labels = class_labels
+        self.class_number = len(class_labels)
+        self.items = items
+        self.dataset_size = dataset_size
+        self.minsup = minsup
+        self.minconf = minconf
+        self.min_count = get_min_count(minsup, dataset_size)
+        self.config = config
+        self.deadline = config.get_deadline(time.time())
+        self.memory_size = 0
+        self.is_length_limited = False
+        self.cars = cba_rg.Car()
+
+    # add rules of the frequent condset items with the class counts into cars
+    def _add_rules(self, items, counts):
+        cond_set = tuple(sorted(items))
+        cond_sup_count = sum(counts)
+        for i in range(self.class_number):
+            if counts[i] >= self.min_count:
+                rule_item = ruleitem.RuleItem.from_counts(cond_set, self.class_labels[i], cond_sup_count, counts[i],
+                                                          self.dataset_size)
+                self.cars._add(rule_item, self.minsup, self.minconf)
+                if self.config.memory_budget is not None:
+                    self.memory_size += cba_rg.get_memory_size([rule_item])
+
+    # mine the conditional FP-tree whose condsets all extend suffix
+    def mine(self, tree, suffix):
+        for rank in reversed(tree.order.tolist()):
+            if self.cars.stop_reason is not None:
+                return
+            cond_set = suffix + (self.items[rank],)
+            self._add_rules(cond_set, tree.item_counts[rank].tolist())
+            self.cars.stop_reason = self.config.check(self.deadline, len(self.cars.rules), self.memory_size)
+            if self.config.max_length is not None and len(cond_set) >= self.config.max_length:
+                self.is_length_limited = True
+                continue
+
+            prefixes, counts = tree.get_conditional_base(rank)
+            if prefixes.size:
+                is_last = self.config.max_length is not None and len(cond_set) + 1 >= self.config.max_length
+                conditional_tree = FPTree(prefixes, counts, tree.pad, self.min_count, merge=not is_last)
+                if len(conditional_tree.order):
+                    self.mine(conditional_tree, cond_set)
+
+
+# main method, mine CARs with FP-growth
+# dataset: a list of data cases, or an EncodedDataset (see encoded.py), whose items are numbered by NumPy
+# config: the limits of mining, see MiningConfig in cba_rg.py. No limit by default. The limits max_candidates and
+#   min_new_rules are about levels, so they have no effect here.
+def rule_generator(dataset, minsup, minconf, config=None):
+    if config is None:
+        config = cba_rg.MiningConfig()
+
+    # number the items and class labels, each data case becomes a row of item numbers
+    if isinstance(dataset, encoded.EncodedDataset):
+        class_labels = list(dataset.class_labels)
+        classes = dataset.classes.astype(np.intp)
+        items = list()
+        columns = list()
+        for column in range(dataset.get_column_number()):
+            values, inverse = np.unique(dataset.matrix[:, column], return_inverse=True)
+            columns.append(inverse.reshape(-1) + len(items))
+            items.extend((column, value) for value in values.tolist())
+        item_numbers = np.column_stack(columns) if columns else np.empty((len(dataset), 0), dtype=np.intp)
+    else:
+        class_labels = list()
+        class_index = dict()
+        items = list()
+        item_index = dict()
+        rows = list()
+        for case in dataset:
+            if case[-1] not in class_index:
+                class_index[case[-1]] = len(class_labels)
+                class_labels.append(case[-1])
+            row = list()
+            for column in range(len(case) - 1):
+                item = (column, case[column])
+                if item not in item_index:
+                    item_index[item] = len(items)
+                    items.append(item)
+                row.append(item_index[item])
+            rows.append(row)
+        classes = np.array([class_index[case[-1]] for case in dataset], dtype=np.intp)
+        item_numbers = np.array(rows, dtype=np.intp).reshape(len(dataset), -1)
+    counts = np.zeros((len(dataset), len(class_labels)), dtype=np.int64)
+    counts[np.arange(len(dataset)), classes] = 1
+
+    # rank the items by their frequency descending, as the order of items on each path
+    item_number = len(items)
+    frequencies = np.bincount(item_numbers.ravel(), minlength=item_number)
+    numbers = sorted(range(item_number), key=lambda number: (-frequencies[number], items[number]))
+    ranks = np.empty(item_number, dtype=np.intp)
+    ranks[numbers] = np.arange(item_number)
+
+    miner = FPGrowth(class_labels, [items[number] for number in numbers], len(dataset), minsup, minconf, config)
+    tree = FPTree(ranks[item_numbers], counts, item_number, miner.min_count)
+    miner.mine(tree, tuple())
+    if miner.cars.stop_reason is None and miner.is_length_limited:
+        miner.cars.stop_reason = 'max_length'
+    return miner.cars
+
+
+# just for test
+if __name__ == "__main__":
+    dataset = [[1, 1, 1], [1, 1, 1], [1, 2, 1], [2, 2, 1], [2, 2, 1],
+               [2, 2, 0], [2, 3, 0], [2, 3, 0], [1, 1, 0], [3, 2, 0]]
+    minsup = 0.15
+    minconf = 0.6
+    cars = rule_generator(dataset, minsup, minconf)
+
+    print("CARs:")
+    cars.print_rule()
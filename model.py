@@ -0,0 +1,146 @@
+"""
+Description: Save and load a trained model, i.e. a classifier built by CBA-CB (see cba_cb_m1.py and cba_cb_m2.py) with
+    the parameters of pre-processing its training data (see pre_processing.py), so that a model can be used again
+    without reading the training data and building the classifier once more. The model is stored in a compact JSON
+    document:
+        {"format": "cba-model", "version": 2, "builder": "m1" or "m2",
+         "class_labels": [class label, ...], "default_class": index in class_labels,
+         "rules": [[index of class label in class_labels, condsupCount, rulesupCount, dataset size,
+                    [item, value, item, value, ...]], ...],
+         "preprocessing": {"columns": the number of attributes, "fill": [[column No., mode], ...],
+                           "walls": [[column No., walls], ...],
+                           "categories": [[column No., [[value, integer], ...]], ...], "discard": [column No., ...],
+                           "codes": [[column No., [[value, integer], ...]], ...]}}
+    The rules are listed in the order of rule_list. Dicts of pre-processing are stored as lists of pairs, so their keys
+    keep their types. "codes" are those of the columns encoded by EncodedDataset (see encoded.py and add_value_codes in
+    pre_processing.py), which rules use instead of the values, so new data are encoded in the same way.
+Input: a classifier and the parameters of pre-processing got from pre_process, or the path of a model file
+Output: a model file, or the classifier and the parameters of pre-processing
+Author: CBA Studio
+"""
+import cba_cb_m1
+import cba_cb_m2
+import ruleitem
+import json
+
+
+MODEL_FORMAT = 'cba-model'
+MODEL_VERSION = 2
+
+
+# convert NumPy scalars (e.g. values got from an EncodedDataset) into Python numbers for JSON
+def _to_json_value(value):
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError("can't save %r in a model" % (value,))
+
+
+# convert the dict of parameters got from pre_process into the form stored in a model
+def encode_params(params):
+    return {
+        'columns': params.get('columns'),
+        'fill': [[column, mode] for column, mode in params.get('fill', dict()).items()],
+        'walls': [[column, walls] for column, walls in params.get('walls', dict()).items()],
+        'categories': [[column, [[value, number] for value, number in categories.items()]]
+                       for column, categories in params.get('categories', dict()).items()],
+        'discard': list(params.get('discard', [])),
+        'codes': [[column, [[value, number] for value, number in codes.items()]]
+                  for column, codes in params.get('codes', dict()).items()]
+    }
+
+
+# convert the parameters stored in a model back into the dict got from pre_process
+def decode_params(document):
+    return {
+        'columns': document.get('columns'),
+        'fill': dict((column, mode) for column, mode in document['fill']),
+        'walls': dict((column, walls) for column, walls in document['walls']),
+        'categories': dict((column, dict((value, number) for value, number in categories))
+                           for column, categories in document['categories']),
+        'discard': document['discard'],
+        'codes': dict((column, dict((value, number) for value, number in codes))
+                      for column, codes in document['codes'])
+    }
+
+
+# save the classifier and the parameters of pre-processing its training data into the file path
+# params: the dict filled by pre_process (see pre_processing.py), None if the data isn't pre-processed
+def save_model(path, classifier, params=None):
+    class_labels = list()
+    class_index = dict()
+    for label in [rule.class_label for rule in classifier.rule_list] + [classifier.default_class]:
+        if label not in class_index:
+            class_index[label] = len(class_labels)
+            class_labels.append(label)
+
+    rules = list()
+    for rule in classifier.rule_list:
+        items = list()
+        for item, value in rule.cond_set:
+            items.append(item)
+            items.append(value)
+        rules.append([class_index[rule.class_label], rule.cond_sup_count, rule.rule_sup_count, rule.dataset_size,
+                      items])
+
+    document = {
+        'format': MODEL_FORMAT,
+        'version': MODEL_VERSION,
+        'builder': 'm2' if isinstance(classifier, cba_cb_m2.Classifier_m2) else 'm1',
+        'class_labels': class_labels,
+        'default_class': class_index[classifier.default_class],
+        'rules': rules,
+        'preprocessing': None if params is None else encode_params(params)
+    }
+    with open(path, 'w') as model_file:
+        json.dump(document, model_file, separators=(',', ':'), default=_to_json_value)
+
+
+# load a model saved by save_model from the file path
+# Returned value: the classifier (Classifier or Classifier_m2, whose rule_list is a list of RuleItem), and the dict of
+#   the parameters of pre-processing (None if not saved)
+def load_model(path):
+    with open(path, 'r') as model_file:
+        document = json.load(model_file)
+    if not isinstance(document, dict) or document.get('format') != MODEL_FORMAT:
+        raise ValueError("%s is not a model file" % path)
+    if document.get('version') != MODEL_VERSION:
+        raise ValueError("unsupported model version %r in %s" % (document.get('version'), path))
+
+    classifier = cba_cb_m2.Classifier_m2() if document['builder'] == 'm2' else cba_cb_m1.Classifier()
+    class_labels = document['class_labels']
+    for class_code, cond_sup_count, rule_sup_count, dataset_size, items in document['rules']:
+        cond_set = tuple(zip(items[0::2], items[1::2]))
+        classifier.rule_list.append(ruleitem.RuleItem.from_counts(cond_set, class_labels[class_code], cond_sup_count,
+                                                                  rule_sup_count, dataset_size))
+    classifier.default_class = class_labels[document['default_class']]
+
+    params = document['preprocessing']
+    return classifier, None if params is None else decode_params(params)
+
+
+# just for test
+if __name__ == '__main__':
+    import cba_rg
+    import os
+    import pre_processing
+    import tempfile
+
+    data = [['red', 25.6, 56, 1], ['green', 33.3, 1, 1], ['green', 2.5, 23, 0], ['blue', 67.2, 111, 1],
+            ['red', 29.0, 34, 0], ['yellow', 99.5, 78, 1], ['yellow', 10.2, 23, 1], ['yellow', 9.9, 30, 0],
+            ['blue', 67.0, 47, 0], ['red', 41.8, 99, 1]]
+    params = dict()
+    dataset = pre_processing.pre_process(data, ['color', 'average', 'age', 'class'],
+                                         ['categorical', 'numerical', 'numerical', 'label'], params)
+    cars = cba_rg.rule_generator(dataset, 0.15, 0.6)
+    classifier = cba_cb_m1.classifier_builder_m1(cars, dataset)
+
+    model_path = os.path.join(tempfile.mkdtemp(), 'test.model')
+    save_model(model_path, classifier, params)
+    loaded_classifier, loaded_params = load_model(model_path)
+    loaded_classifier.print()
+    print(loaded_params == params)                                              # should be True
+    print([rule.cond_set for rule in loaded_classifier.rule_list] ==
+          [rule.cond_set for rule in classifier.rule_list])                      # should be True
+    rows = pre_processing.Preprocessor(loaded_params).transform([['red', 25.6, 56], ['blue', 67.2, 111]])
+    print(loaded_classifier.predict_batch(rows).tolist() ==
+          classifier.predict_batch([dataset[0][:-1], dataset[3][:-1]]).tolist())  # should be True
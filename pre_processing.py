@@ -12,36 +12,85 @@ Reference:
     1. http://cgi.csc.liv.ac.uk/~frans/KDD/Software/LUCS-KDD-DN/lucs-kdd_DN.html
 """
 import rmep
+import bisect
+import multiprocessing
+import numpy as np
+
+
+# The profile of a column, i.e. the number of values, missing values and appearance times of each value, accumulated
+#   value by value, so that all columns are profiled in a single pass over the data (see profile_columns).
+# It has 3 member:
+#   size: the number of values, including missing ones
+#   missing: the number of missing values ('?')
+#   counts: a dict {value: appearance times} of the values except missing ones, in order of their first appearance
+class ColumnProfile:
+    def __init__(self):
+        self.size = 0
+        self.missing = 0
+        self.counts = dict()
+
+    # add a value of the column
+    def add(self, value):
+        self.size += 1
+        if value == '?':
+            self.missing += 1
+        else:
+            self.counts[value] = self.counts.get(value, 0) + 1
+
+    # the ratio of missing values
+    def get_missing_ratio(self):
+        return self.missing / self.size if self.size > 0 else 0
+
+    # the mode of values except missing ones, see get_mode
+    def get_mode(self):
+        if not self.counts:
+            return
+        max_count = max(self.counts.values())
+        if max_count == 1:          # if max time is 1
+            return                  # no mode here
+        for value, count in self.counts.items():
+            if count == max_count:
+                return value        # return first value if has many modes
+
+
+# Profile every column except the class label column of rows in one pass
+# rows: a list (or any iterable) of data cases
+# profiles: the profiles of columns got from previous rows, to be updated with rows; None to start new profiles
+# Returned value: a list of ColumnProfile, one for each column
+def profile_columns(rows, profiles=None):
+    for row in rows:
+        if profiles is None:
+            profiles = [ColumnProfile() for _ in range(len(row) - 1)]
+        for profile, value in zip(profiles, row):
+            profile.add(value)
+    return profiles if profiles is not None else []
 
 
 # Identify the mode of a list, both effective for numerical and categorical list. When there exists too many modes
 #   having the same frequency, return the first one.
 # arr: a list need to find mode
 def get_mode(arr):
-    mode = []
-    arr_appear = dict((a, arr.count(a)) for a in arr)   # count appearance times of each key
-    if max(arr_appear.values()) == 1:       # if max time is 1
-        return      # no mode here
-    else:
-        for k, v in arr_appear.items():     # else, mode is the number which has max time
-            if v == max(arr_appear.values()):
-                mode.append(k)
-    return mode[0]  # return first number if has many modes
+    profile = ColumnProfile()
+    for a in arr:
+        profile.add(a)
+    return profile.get_mode()
 
 
 # Fill missing values in column column_no, when missing values ration below 50%.
 # data: original data list
 # column_no: identify the column No. of that to be filled
-def fill_missing_values(data, column_no):
-    size = len(data)
-    column_data = [x[column_no] for x in data]      # get that column
-    while '?' in column_data:
-        column_data.remove('?')
-    mode = get_mode(column_data)
-    for i in range(size):
-        if data[i][column_no] == '?':
-            data[i][column_no] = mode              # fill in mode
-    return data
+# profile: the ColumnProfile of that column, None to profile it here
+# Returned value: the data list after filling, and the mode filled in
+def fill_missing_values(data, column_no, profile=None):
+    if profile is None:
+        profile = ColumnProfile()
+        for x in data:
+            profile.add(x[column_no])
+    mode = profile.get_mode()
+    for case in data:
+        if case[column_no] == '?':
+            case[column_no] = mode                  # fill in mode
+    return data, mode
 
 
 # Get the list needed by rmep.py, just glue the data column with class column.
@@ -58,18 +107,12 @@ def get_discretization_data(data_column, class_column):
 # Replace numerical data with the No. of interval, i.e. consecutive positive integers.
 # data: original data table
 # column_no: the column No. of that column
-# walls: the split point of the whole range
+# walls: the split point of the whole range in ascending order, a value v is replaced by j + 1 where j is the first
+#   split point with v <= walls[j], or by len(walls) + 1 if v is above all of them, found by binary search
 def replace_numerical(data, column_no, walls):
     size = len(data)
-    num_spilt_point = len(walls)
     for i in range(size):
-        if data[i][column_no] > walls[num_spilt_point - 1]:
-            data[i][column_no] = num_spilt_point + 1
-            continue
-        for j in range(0, num_spilt_point):
-            if data[i][column_no] <= walls[j]:
-                data[i][column_no] = j + 1
-                break
+        data[i][column_no] = bisect.bisect_left(walls, data[i][column_no]) + 1
     return data
 
 
@@ -104,52 +147,207 @@ def discard(data, discard_list):
     return data_result
 
 
+# Find the split points of a numerical column by RMEP (see rmep.py). If there's no split point, split the range into 3
+#   intervals of the same width.
+# data_column: the numerical column without missing values
+# class_column: the class label column
+def get_walls(data_column, class_column):
+    discretization_data = get_discretization_data(data_column, class_column)
+    block = rmep.Block(discretization_data)
+    walls = rmep.partition(block)
+    if len(walls) == 0:
+        walls = get_equal_width_walls(min(data_column), max(data_column))
+    return walls
+
+
+# Split the range [min_value, max_value] into 3 intervals of the same width, return the split points
+def get_equal_width_walls(min_value, max_value):
+    step = (max_value - min_value) / 3
+    return [min_value + step, min_value + 2 * step]
+
+
+# Find the split points of the numerical columns, each column is discretized independently
+# data: data table without missing values in these columns
+# column_list: the column No. of numerical columns
+# processes: the number of worker processes discretizing columns in parallel, None or 1 means discretizing in this
+#   process. The split points are the same in both ways.
+# Returned value: a dict {column No.: walls}
+def discretize(data, column_list, processes=None):
+    class_column = [x[-1] for x in data]
+    tasks = [([x[i] for x in data], class_column) for i in column_list]
+    if processes is None or processes <= 1:
+        walls_list = [get_walls(*task) for task in tasks]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            walls_list = pool.starmap(get_walls, tasks)
+    return dict(zip(column_list, walls_list))
+
+
 # Main method here, see Description in detail
 # data: original data table
 # attribute: a list of the name of attribute
 # value_type: a list identifying the type of each column
+# params: optional, a dict to be filled with the parameters of pre-processing, so that a model can process new data in
+#   the same way (see model.py):
+#   {'columns': the number of attributes, 'fill': {column No.: mode}, 'walls': {column No.: walls},
+#    'categories': {column No.: {value: integer}}, 'discard': discard_list, 'codes': {column No.: {value: integer}}}
+#   'codes' is empty here, it's filled by add_value_codes for the columns encoded by EncodedDataset (see encoded.py)
+# processes: the number of worker processes discretizing numerical columns in parallel (see discretize), the result is
+#   the same as the serial one
+# walls: optional, a dict {column No.: walls} of the numerical columns found before (e.g. by FoldDiscretizer), to be
+#   used instead of discretizing data
 # Returned value: a data table after process
-def pre_process(data, attribute, value_type):
+def pre_process(data, attribute, value_type, params=None, processes=None, walls=None):
+    if params is None:
+        params = dict()
     column_num = len(data[0])
-    size = len(data)
-    class_column = [x[-1] for x in data]
+    params.update({'columns': column_num - 1, 'fill': dict(), 'walls': dict(), 'categories': dict(), 'discard': [],
+                   'codes': dict()})
     discard_list = []
-    for i in range(0, column_num - 1):
-        data_column = [x[i] for x in data]
 
-        # process missing values
-        missing_values_ratio = data_column.count('?') / size
+    # process missing values, all columns are profiled in one pass
+    profiles = profile_columns(data)
+    for i in range(0, column_num - 1):
+        missing_values_ratio = profiles[i].get_missing_ratio()
         if missing_values_ratio > 0.5:
             discard_list.append(i)
-            continue
         elif missing_values_ratio > 0:
-            data = fill_missing_values(data, i)
-            data_column = [x[i] for x in data]
+            data, params['fill'][i] = fill_missing_values(data, i, profiles[i])
 
-        # discretization
+    # discretization, the walls of all numerical columns are found at first
+    if walls is not None:
+        column_walls = walls
+    else:
+        column_walls = discretize(data, [i for i in range(0, column_num - 1)
+                                         if i not in discard_list and value_type[i] == 'numerical'], processes)
+    for i in range(0, column_num - 1):
+        if i in discard_list:
+            continue
         if value_type[i] == 'numerical':
-            discretization_data = get_discretization_data(data_column, class_column)
-            block = rmep.Block(discretization_data)
-            walls = rmep.partition(block)
-            if len(walls) == 0:
-                max_value = max(data_column)
-                min_value = min(data_column)
-                step = (max_value - min_value) / 3
-                walls.append(min_value + step)
-                walls.append(min_value + 2 * step)
+            walls = column_walls[i]
             print(attribute[i] + ":", walls)        # print out split points
+            params['walls'][i] = walls
             data = replace_numerical(data, i, walls)
         elif value_type[i] == 'categorical':
             data, classes_no = replace_categorical(data, i)
             print(attribute[i] + ":", classes_no)   # print out replacement list
+            params['categories'][i] = classes_no
 
     # discard
     if len(discard_list) > 0:
         data = discard(data, discard_list)
         print("discard:", discard_list)             # print out discard list
+    params['discard'] = discard_list
     return data
 
 
+# add the codes of the columns encoded by EncodedDataset into params filled by pre_process, so that these columns of new
+#   data are encoded in the same way by Preprocessor
+# value_codes: the value_codes of the EncodedDataset built from the data after pre_process, whose columns are those
+#   left after discard
+def add_value_codes(params, value_codes):
+    kept_columns = [i for i in range(params['columns']) if i not in params['discard']]
+    for column, codes in value_codes.items():
+        params['codes'][kept_columns[column]] = codes
+
+
+class FoldDiscretizer:
+    """
+    Discretize the numerical columns with only the data cases in a training set (e.g. a fold of cross-validation), so
+    that the test set doesn't leak into the walls. Each numerical column is sorted only once, with its missing values
+    filled in the same way as pre_process. The sorted column and class labels of a training set are got by masking the
+    sorted ones, which keeps them sorted, so RMEP (see partition_sorted in rmep.py) needs no sort for each training set.
+    columns: a dict {column No.: (sorted values, class labels in the same order, order)}, order[i] is the row of the
+        i-th sorted value.
+    """
+    def __init__(self, data, value_type):
+        self.size = len(data)
+        profiles = profile_columns(data)
+        class_column = np.array([x[-1] for x in data], dtype=object)
+        self.columns = dict()
+        for i in range(len(profiles)):
+            if value_type[i] != 'numerical' or profiles[i].get_missing_ratio() > 0.5:
+                continue
+            mode = profiles[i].get_mode()
+            values = np.array([mode if x[i] == '?' else x[i] for x in data], dtype=float)
+            order = np.argsort(values, kind='stable')
+            self.columns[i] = (values[order], class_column[order], order)
+
+    # find the walls of numerical columns with the training set
+    # training_rows: the row No. of data cases in the training set
+    # Returned value: a dict {column No.: walls}, which can be used by pre_process
+    def get_walls(self, training_rows):
+        is_training = np.zeros(self.size, dtype=bool)
+        is_training[training_rows] = True
+        column_walls = dict()
+        for i, (values, classes, order) in self.columns.items():
+            mask = is_training[order]
+            training_values = values[mask].tolist()
+            walls = rmep.partition_sorted(training_values, classes[mask].tolist())
+            if len(walls) == 0:
+                walls = get_equal_width_walls(training_values[0], training_values[-1])
+            column_walls[i] = walls
+        return column_walls
+
+
+class Preprocessor:
+    """
+    Pre-process data in the same way as the training data. The parameters are learnt once by fit_transform (see
+    pre_process), or got from a saved model (see model.py), then new data are transformed in batch: numerical values by
+    binary search over the walls with NumPy, and categorical values (and the values encoded by EncodedDataset, see
+    add_value_codes) by dict lookup, without running RMEP again.
+    params: the dict of parameters filled by pre_process.
+    """
+    def __init__(self, params=None):
+        self.params = params
+
+    # learn the parameters from the training data, return the training data after process
+    # processes: see pre_process
+    def fit_transform(self, data, attribute, value_type, processes=None):
+        self.params = dict()
+        return pre_process(data, attribute, value_type, self.params, processes)
+
+    # transform data cases, return a NumPy matrix of the attributes after process, which can be used by predict_batch of
+    #   classifiers (see predictor.py). The values never seen in training data, and the missing values of columns that
+    #   had none in training data, are replaced by 0, so no rule covers them.
+    # data: a list of data cases, whose attributes are in the same columns as the training data (read by read.py), a
+    #   class label at the end is ignored
+    def transform(self, data):
+        if self.params is None:
+            raise ValueError("the Preprocessor isn't fitted yet")
+        columns = list()
+        for i in range(self.params['columns']):
+            if i in self.params['discard']:
+                continue
+            data_column = [x[i] for x in data]
+            if i in self.params['fill']:
+                mode = self.params['fill'][i]
+                data_column = [mode if value == '?' else value for value in data_column]
+
+            if i in self.params['walls']:
+                values = np.array([np.nan if value == '?' else value for value in data_column], dtype=float)
+                intervals = np.searchsorted(self.params['walls'][i], values, side='left') + 1
+                columns.append(np.where(np.isnan(values), 0, intervals))
+            elif i in self.params['categories']:
+                classes_no = self.params['categories'][i]
+                columns.append(np.array([classes_no.get(value, 0) for value in data_column], dtype=np.int64))
+            elif i in self.params['codes']:
+                value_codes = self.params['codes'][i]
+                columns.append(np.array([value_codes.get(value, 0) for value in data_column], dtype=np.int64))
+            else:
+                columns.append(np.array(data_column))
+        if not columns:
+            return np.empty((len(data), 0), dtype=np.int64)
+        if all(column.dtype.kind in 'biuf' for column in columns):
+            return np.column_stack(columns)
+
+        # some columns are neither numerical nor categorical, keep their values as they are
+        matrix = np.empty((len(data), len(columns)), dtype=object)
+        for j, column in enumerate(columns):
+            matrix[:, j] = column.tolist()
+        return matrix
+
+
 # just for test
 if __name__ == '__main__':
     test_data = [
@@ -166,5 +364,10 @@ if __name__ == '__main__':
     ]
     test_attribute = ['color', 'average', 'age', 'class']
     test_value_type = ['categorical', 'numerical', 'numerical', 'label']
-    test_data_after = pre_process(test_data, test_attribute, test_value_type)
+    test_data_after = pre_process([case[:] for case in test_data], test_attribute, test_value_type)
     print(test_data_after)
+
+    print()
+    preprocessor = Preprocessor()
+    test_data_after = preprocessor.fit_transform([case[:] for case in test_data], test_attribute, test_value_type)
+    print(preprocessor.transform(test_data).tolist() == [case[:-1] for case in test_data_after])     # should be True
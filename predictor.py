@@ -0,0 +1,124 @@
+"""
+Description: Batch prediction with a classifier built by CBA-CB (see cba_cb_m1.py and cba_cb_m2.py). The ordered rule
+    list is compiled once into one table of rule masks per attribute: for each value of the attribute used by some rule,
+    a boolean vector over the rules telling which rules accept it (the rules with this value in their condset, and the
+    rules without any condition on this attribute). The rules matching a whole block of rows are got by AND-ing the
+    masks looked up by the values of rows, and each row is labelled by the first matching rule in precedence order, or
+    by the default class if no rule matches it.
+Input: a classifier, and a NumPy matrix (or a list) of data cases without class label
+Output: the predicted class labels
+Author: CBA Studio
+"""
+import numpy as np
+
+
+# the maximum number of cells of the (rows x rules) matrix of matches in a block, to bound the memory used
+BLOCK_CELLS = 1 << 22
+# the kinds of NumPy dtype (bool, integer and float) whose values are looked up by binary search
+NUMERIC_KINDS = 'biuf'
+
+
+class CompiledRules:
+    """
+    The compiled form of the rule list and default class of a classifier.
+    rule_list, default_class: what it's compiled from, rule_list is a copy, so it isn't changed with the rule list of
+        the classifier.
+    class_labels: a NumPy vector of class labels.
+    rule_classes: a NumPy vector, rule_classes[rank] is the index in class_labels of the class of the rank-th rule, and
+        rule_classes[len(rule_list)] is that of the default class.
+    columns: a dict {attribute: (values, value_index, masks)}. values is a sorted NumPy vector of the values used by
+        rules, value_index is a dict {value: its index in values}, masks is a boolean matrix, masks[i][rank] tells
+        whether the rank-th rule accepts values[i], and masks[len(values)] is for the values used by no rule.
+    """
+    def __init__(self, rule_list, default_class):
+        self.rule_list = list(rule_list)
+        self.default_class = default_class
+        rule_number = len(rule_list)
+
+        class_labels = list()
+        class_index = dict()
+        rule_classes = list()
+        for label in [rule.class_label for rule in rule_list] + [default_class]:
+            if label not in class_index:
+                class_index[label] = len(class_labels)
+                class_labels.append(label)
+            rule_classes.append(class_index[label])
+        self.class_labels = np.array(class_labels)
+        self.rule_classes = np.array(rule_classes, dtype=np.intp)
+
+        conditions = dict()
+        for rank, rule in enumerate(rule_list):
+            for item, value in rule.cond_set:
+                conditions.setdefault(item, []).append((rank, value))
+        self.columns = dict()
+        for item, item_conditions in conditions.items():
+            values = sorted(set(value for rank, value in item_conditions))
+            value_index = dict((value, i) for i, value in enumerate(values))
+            masks = np.ones((len(values) + 1, rule_number), dtype=bool)
+            for rank, value in item_conditions:
+                masks[:, rank] = False
+                masks[value_index[value], rank] = True
+            self.columns[item] = (np.array(values), value_index, masks)
+
+    # get the rank of the first rule matching each row, len(rule_list) if no rule matches it
+    # rows: a NumPy matrix, rows[i][j] is the value of the j-th attribute of the i-th row
+    def match(self, rows):
+        rule_number = len(self.rule_list)
+        ranks = np.full(len(rows), rule_number, dtype=np.intp)
+        if rule_number == 0:
+            return ranks
+
+        block_size = max(BLOCK_CELLS // rule_number, 1)
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            matched = np.ones((len(block), rule_number), dtype=bool)
+            for item, (values, value_index, masks) in self.columns.items():
+                column = block[:, item]
+                if column.dtype.kind in NUMERIC_KINDS and values.dtype.kind in NUMERIC_KINDS:
+                    positions = np.minimum(np.searchsorted(values, column), len(values) - 1)
+                    indexes = np.where(values[positions] == column, positions, len(values))
+                else:
+                    indexes = np.fromiter((value_index.get(value, len(values)) for value in column.tolist()),
+                                          dtype=np.intp, count=len(column))
+                matched &= masks[indexes]
+            first_ranks = matched.argmax(axis=1)
+            is_matched = matched[np.arange(len(block)), first_ranks]
+            ranks[start:start + block_size] = np.where(is_matched, first_ranks, rule_number)
+        return ranks
+
+    # predict the class labels of rows, return a NumPy vector
+    # rows: a NumPy matrix or a list of data cases, without class label
+    def predict_batch(self, rows):
+        matrix = np.asarray(rows)
+        if matrix.dtype.kind not in NUMERIC_KINDS:
+            # keep the values as they are, e.g. integers of a list mixed with strings aren't converted into strings
+            matrix = np.asarray(rows, dtype=object)
+        return self.class_labels[self.rule_classes[self.match(matrix)]]
+
+
+# get the CompiledRules of classifier, which is kept in the classifier and compiled again only when its rule list or
+#   default class is changed, including changes in place (e.g. a rule inserted into rule_list). The rule lists are
+#   compared rule by rule, which is cheap beside prediction since the same rules are the same objects
+def compile_classifier(classifier):
+    compiled_rules = getattr(classifier, '_compiled_rules', None)
+    if compiled_rules is None or compiled_rules.rule_list != classifier.rule_list or \
+            compiled_rules.default_class != classifier.default_class:
+        compiled_rules = CompiledRules(classifier.rule_list, classifier.default_class)
+        classifier._compiled_rules = compiled_rules
+    return compiled_rules
+
+
+# just for test
+if __name__ == '__main__':
+    import cba_rg
+    import cba_cb_m1
+
+    dataset = [[1, 1, 1], [1, 1, 1], [1, 2, 1], [2, 2, 1], [2, 2, 1],
+               [2, 2, 0], [2, 3, 0], [2, 3, 0], [1, 1, 0], [3, 2, 0]]
+    cars = cba_rg.rule_generator(dataset, 0.15, 0.6)
+    classifier = cba_cb_m1.classifier_builder_m1(cars, dataset)
+    classifier.print()
+    print(classifier.predict_batch([case[:-1] for case in dataset]))    # should be [1 1 1 1 1 1 0 0 1 0]
+    print(classifier.predict([4, 4]))                                   # should be the default class
+    classifier.rule_list.insert(0, classifier.rule_list[-1])
+    print(classifier.predict_batch([case[:-1] for case in dataset]))    # compiled again, no stale table
@@ -1,6 +1,7 @@
 """
 Description: Read initial dataset and decode it into a list. Here we replace all missing value and discretizate
-    the numerical values.
+    the numerical values. The dataset can be read as a stream of data cases or chunks as well, parsing numerical
+    values while reading, so a large file needn't be loaded as strings at first.
 Input: initial dataset stored in *.data file, and scheme description stored in *.names file.
 Output: a data list after pre-processing.
 Author: CBA Studio
@@ -8,19 +9,51 @@ Author: CBA Studio
 import csv
 
 
-# Read dataset and convert into a list.
+# Read dataset and convert into a list, blank lines are skipped.
 # path: directory of *.data file.
 def read_data(path):
     data = []
     with open(path, 'r') as csv_file:
         reader = csv.reader(csv_file, delimiter=',')
         for line in reader:
-            data.append(line)
-        while [] in data:
-            data.remove([])
+            if line:
+                data.append(line)
     return data
 
 
+# Read dataset line by line and yield data cases one by one, without loading the whole file. Blank lines are skipped,
+#   and numerical values are converted into float-type as they are read (see str2numerical).
+# path: directory of *.data file.
+# value_type: list returned by read_scheme.
+def iter_rows(path, value_type):
+    numerical_columns = [j for j in range(len(value_type)) if value_type[j] == 'numerical']
+    with open(path, 'r') as csv_file:
+        reader = csv.reader(csv_file, delimiter=',')
+        for line in reader:
+            if not line:
+                continue
+            for j in numerical_columns:
+                if j < len(line) - 1 and line[j] != '?':
+                    line[j] = float(line[j])
+            yield line
+
+
+# Read dataset and yield lists of at most chunk_size data cases (see iter_rows), so that statistics of a large file can
+#   be accumulated chunk by chunk (e.g. profile_columns in pre_processing.py).
+# path: directory of *.data file.
+# value_type: list returned by read_scheme.
+# chunk_size: the max number of data cases in a chunk.
+def iter_chunks(path, value_type, chunk_size=10000):
+    chunk = []
+    for row in iter_rows(path, value_type):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 # Read scheme file *.names and write down attributes and value types.
 # path: directory of *.names file.
 def read_scheme(path):
@@ -48,9 +81,8 @@ def str2numerical(data, value_type):
 # data_path: tell where *.data file stores.
 # scheme_path: tell where *.names file stores.
 def read(data_path, scheme_path):
-    data = read_data(data_path)
     attributes, value_type = read_scheme(scheme_path)
-    data = str2numerical(data, value_type)
+    data = list(iter_rows(data_path, value_type))
     return data, attributes, value_type
 
 
@@ -63,3 +95,9 @@ if __name__ == '__main__':
     test_data, test_attributes, test_value_type = read(test_data_path, test_scheme_path)
     result_data = pre_processing.pre_process(test_data, test_attributes, test_value_type)
     print(result_data)
+
+    # profile the columns chunk by chunk
+    test_profiles = None
+    for test_chunk in iter_chunks(test_data_path, test_value_type, chunk_size=50):
+        test_profiles = pre_processing.profile_columns(test_chunk, test_profiles)
+    print([profile.get_missing_ratio() for profile in test_profiles])
@@ -1,7 +1,8 @@
 """
 Description: Recursive minimal entropy partitioning, to discretize continuous-valued attributes. We use the supervised
     algorithm presented in Fayyad & Irani (1993) and introduced in Dougherty, Kohavi & Sahami (1995) section 3.3.
-    We also refer to a F# code on GitHub (https://gist.github.com/mathias-brandewinder/5650553).
+    We also refer to a F# code on GitHub (https://gist.github.com/mathias-brandewinder/5650553). The column is sorted
+    only once, and each split is found by a single sweep over the boundary points of a range of the sorted column.
 Input: a data table with several rows but only two column, the first column is continuous-valued (numerical) attributes,
     and the second column is the class label of each data case (categorical).
     e.g. data = [[1.0, 'Yes'], [0.5, 'No'], [2.0, 'Yes']]
@@ -72,65 +73,120 @@ def min_gain(original_block, left_block, right_block):
     return gain_sup
 
 
-# Identify the best acceptable value to split block
-# block: a block of dataset
-# Return value: a list of (boundary, entropy gain, left block, right block) or
-#   None when it's unnecessary to split
-def split(block):
-    candidates = [x[0] for x in block.data]     # candidates is a list of values can be picked up as boundary
-    candidates = list(set(candidates))          # get different values in table
-    candidates.sort()                           # sort ascending
-    candidates = candidates[1:]                 # discard smallest, because by definition no value is smaller
-
-    wall = []       # wall is a list storing final boundary
-    for value in candidates:
-        # split by value into 2 groups, below & above
-        left_data = []
-        right_data = []
-        for data_case in block.data:
-            if data_case[0] < value:
-                left_data.append(data_case)
-            else:
-                right_data.append(data_case)
-
-        left_block = Block(left_data)
-        right_block = Block(right_data)
-
-        gain = entropy_gain(block, left_block, right_block)
-        threshold = min_gain(block, left_block, right_block)
+# A range [low, high) of the sorted column to be split, represented by its class counts instead of a copy of the data
+# It has 5 member:
+#   low, high: the range in the sorted column
+#   class_counts: a list, class_counts[i] is the number of data case of the i-th class in this range
+#   size, number_of_classes and entropy: the same as Block
+class Interval:
+    def __init__(self, low, high, class_counts):
+        self.low = low
+        self.high = high
+        self.class_counts = class_counts
+        self.size = high - low
+        self.number_of_classes = len(class_counts) - class_counts.count(0)
+        self.entropy = calculate_entropy_of_counts(class_counts, self.size)
+
+
+# Calculate the entropy from the number of data case of each class
+# class_counts: a list of the number of data case of each class
+# size: the total number of data case
+def calculate_entropy_of_counts(class_counts, size):
+    entropy = 0
+    for count in class_counts:
+        if count > 0:
+            p = count / size
+            entropy -= p * math.log2(p)
+    return entropy
 
-        # minimum threshold is met, the value is an acceptable candidate
-        if gain >= threshold:
-            wall.append([value, gain, left_block, right_block])
 
-    if wall:    # has candidate
-        wall.sort(key=lambda wall: wall[1], reverse=True)   # sort descending by "gain"
-        return wall[0]      # return best candidate with max entropy gain
-    else:
-        return None         # no need to split
+# Identify the best acceptable value to split the range of interval, by sweeping the sorted column once and keeping the
+#   class counts of the left part. Only the boundary points are tried, i.e. the values whose data cases and those of the
+#   previous value are not all in the same class, because the best split is always at a boundary point (Fayyad & Irani,
+#   1993).
+# interval: a range of the sorted column
+# values: the sorted column of continuous-valued attribute
+# classes: the class of each data case in values, as the index in class_counts
+# Return value: a list of (boundary, entropy gain, left interval, right interval) or
+#   None when it's unnecessary to split
+def split(interval, values, classes):
+    class_number = len(interval.class_counts)
+    left_counts = [0] * class_number
+    best_wall = None
+
+    # the class of the data cases of the previous value, None if they are in several classes
+    previous_class = None
+    low = interval.low
+    while low < interval.high:
+        value = values[low]
+        high = low
+        while high < interval.high and values[high] == value:
+            high += 1
+        current_class = classes[low]
+        for i in range(low + 1, high):
+            if classes[i] != current_class:
+                current_class = None
+                break
 
+        # split by value into 2 groups, below & above
+        if low > interval.low and (current_class is None or current_class != previous_class):
+            right_counts = [interval.class_counts[i] - left_counts[i] for i in range(class_number)]
+            left_interval = Interval(interval.low, low, list(left_counts))
+            right_interval = Interval(low, interval.high, right_counts)
+
+            gain = entropy_gain(interval, left_interval, right_interval)
+            threshold = min_gain(interval, left_interval, right_interval)
+
+            # minimum threshold is met, the value is an acceptable candidate with max entropy gain so far
+            if gain >= threshold and (best_wall is None or gain > best_wall[1]):
+                best_wall = [value, gain, left_interval, right_interval]
+
+        for i in range(low, high):
+            left_counts[classes[i]] += 1
+        previous_class = current_class
+        low = high
+
+    return best_wall
+
+
+# Top-down recursive partition of a sorted column, return the boundaries in ascending order
+# values: the column of continuous-valued attribute in ascending order
+# classes: the class label of each data case in values
+def partition_sorted(values, classes):
+    class_index = dict()
+    for label in classes:
+        if label not in class_index:
+            class_index[label] = len(class_index)
+    classes = [class_index[label] for label in classes]
+    class_counts = [0] * len(class_index)
+    for code in classes:
+        class_counts[code] += 1
 
-# Top-down recursive partition of a data block, append boundary into "walls"
-# block: a data block
-def partition(block):
     walls = []
 
     # inner recursive function, accumulate the partitioning values
-    # sub_block: just a data block
-    def recursive_split(sub_block):
-        wall_returned = split(sub_block)        # binary partition, get bin boundary
-        if wall_returned:                       # still can be spilt
-            walls.append(wall_returned[0])      # record this partitioning value
-            recursive_split(wall_returned[2])   # recursively process left block
-            recursive_split(wall_returned[3])   # recursively split right block
+    # sub_interval: just a range of the sorted column
+    def recursive_split(sub_interval):
+        wall_returned = split(sub_interval, values, classes)    # binary partition, get bin boundary
+        if wall_returned:                                       # still can be spilt
+            walls.append(wall_returned[0])                      # record this partitioning value
+            recursive_split(wall_returned[2])                   # recursively process left interval
+            recursive_split(wall_returned[3])                   # recursively split right interval
         else:
-            return                              # end of recursion
+            return                                              # end of recursion
 
-    recursive_split(block)      # call inner function
-    walls.sort()                # sort boundaries descending
+    recursive_split(Interval(0, len(values), class_counts))     # call inner function
+    walls.sort()                # sort boundaries ascending
     return walls
 
 
+# Top-down recursive partition of a data block, the column is sorted only once (see partition_sorted)
+# block: a data block
+def partition(block):
+    data = sorted(block.data, key=lambda x: x[0])
+    return partition_sorted([x[0] for x in data], [x[1] for x in data])
+
+
 # just for test
 if __name__ == '__main__':
     import random
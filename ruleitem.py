@@ -6,58 +6,133 @@ Output: a ruleitem with its condsupCount, rulesupCount, support and confidence.
 Author: CBA Studio
 Reference: https://www.cs.uic.edu/~hxiao/courses/cs594-slides.pdf
 """
+import encoded
+import vertical
+
+
+# get the canonical and hashable form of a cond_set, i.e. a tuple of (item name, value) sorted by item name, so that two
+#   cond_sets with the same items get the same key whatever order they are given in
+# cond_set: a dict {item name: value, ...}, or an iterable of (item name, value)
+def cond_set_key(cond_set):
+    if isinstance(cond_set, dict):
+        cond_set = cond_set.items()
+    return tuple(sorted(cond_set))
+
+
+# count the data cases covered by cond_set in every class with a single scan of dataset (or a single bitset intersection
+#   when dataset is a VerticalDataset, or vectorized operations when it is an EncodedDataset), return condsupCount and
+#   a dict {class label: rulesupCount}
+# cond_set: a tuple of (item name, value)
+def get_class_histogram(cond_set, dataset):
+    if isinstance(dataset, (vertical.VerticalDataset, encoded.EncodedDataset)):
+        return dataset.get_class_histogram(cond_set)
+
+    cond_sup_count = 0
+    histogram = dict()
+    for case in dataset:
+        is_contained = True
+        for item, value in cond_set:
+            if value != case[item]:
+                is_contained = False
+                break
+        if is_contained:
+            cond_sup_count += 1
+            histogram[case[-1]] = histogram.get(case[-1], 0) + 1
+    return cond_sup_count, histogram
+
+
+# calculate condsupCount and rulesupCount of the ruleitem <cond_set, class_label>
+# cond_set: a tuple of (item name, value)
+def get_sup_count(cond_set, class_label, dataset):
+    if isinstance(dataset, (vertical.VerticalDataset, encoded.EncodedDataset)):
+        return dataset.get_sup_count(cond_set, class_label)
+
+    cond_sup_count, histogram = get_class_histogram(cond_set, dataset)
+    return cond_sup_count, histogram.get(class_label, 0)
 
 
 class RuleItem:
     """
-    cond_set: a dict with following fashion:
-            {item name: value, item name: value, ...}
+    An immutable record of a ruleitem. It has no __dict__, so it takes much less memory than an ordinary object, and it
+    is hashable by its condset and class label.
+    cond_set: a tuple of (item name, value) sorted by item name (see cond_set_key), with following fashion:
+            ((item name, value), (item name, value), ...)
         e.g.
-            {A: 1, B: 1} (A, B are name of columns, here called "item", and in our code should be numerical index
-                          but not string)
+            ((A, 1), (B, 1)) (A, B are name of columns, here called "item", and in our code should be numerical index
+                              but not string)
+        a dict {item name: value, ...} is accepted as well, and it's converted into the tuple.
     class_label: just to identify the class it belongs to.
-    dataset: a list returned by read method. (see read.py)
-    cond_sup_count, rule_sup_count, support and confidence are number.
+    dataset: a list returned by read method (see read.py), or a VerticalDataset built from it (see vertical.py) or an
+        EncodedDataset (see encoded.py), in which case the counts are got by bitset intersection or vectorized
+        operations instead of scanning the dataset.
+    cond_sup_count, rule_sup_count, dataset_size (the number of data cases they are counted in), support and confidence
+        are number.
+    coverage: optional, the bitset of data cases covered by cond_set (see vertical.py), None if unknown.
     """
+    __slots__ = ('cond_set', 'class_label', 'cond_sup_count', 'rule_sup_count', 'dataset_size', 'support', 'confidence',
+                 'coverage')
+
     def __init__(self, cond_set, class_label, dataset):
-        self.cond_set = cond_set
-        self.class_label = class_label
-        self.cond_sup_count, self.rule_sup_count = self._get_sup_count(dataset)
-        self.support = self._get_support(len(dataset))
-        self.confidence = self._get_confidence()
-
-    # calculate condsupCount and rulesupCount
-    def _get_sup_count(self, dataset):
-        cond_sup_count = 0
-        rule_sup_count = 0
-        for case in dataset:
-            is_contained = True
-            for index in self.cond_set:
-                if self.cond_set[index] != case[index]:
-                    is_contained = False
-                    break
-            if is_contained:
-                cond_sup_count += 1
-                if self.class_label == case[-1]:
-                    rule_sup_count += 1
-        return cond_sup_count, rule_sup_count
-
-    # calculate support count
-    def _get_support(self, dataset_size):
-        return self.rule_sup_count / dataset_size
-
-    # calculate confidence
-    def _get_confidence(self):
-        if self.cond_sup_count != 0:
-            return self.rule_sup_count / self.cond_sup_count
-        else:
-            return 0
+        cond_set = cond_set_key(cond_set)
+        cond_sup_count, rule_sup_count = get_sup_count(cond_set, class_label, dataset)
+        self._set_fields(cond_set, class_label, cond_sup_count, rule_sup_count, len(dataset))
+
+    # build a ruleitem from counts which have been calculated already (e.g. by get_class_histogram), without scanning
+    #   the dataset again
+    @classmethod
+    def from_counts(cls, cond_set, class_label, cond_sup_count, rule_sup_count, dataset_size, coverage=None):
+        rule_item = cls.__new__(cls)
+        rule_item._set_fields(cond_set_key(cond_set), class_label, cond_sup_count, rule_sup_count, dataset_size,
+                              coverage)
+        return rule_item
+
+    # get the same ruleitem with the coverage bitset
+    def with_coverage(self, coverage):
+        return RuleItem.from_counts(self.cond_set, self.class_label, self.cond_sup_count, self.rule_sup_count,
+                                    self.dataset_size, coverage)
+
+    def _set_fields(self, cond_set, class_label, cond_sup_count, rule_sup_count, dataset_size, coverage=None):
+        object.__setattr__(self, 'cond_set', cond_set)
+        object.__setattr__(self, 'class_label', class_label)
+        object.__setattr__(self, 'cond_sup_count', cond_sup_count)
+        object.__setattr__(self, 'rule_sup_count', rule_sup_count)
+        object.__setattr__(self, 'dataset_size', dataset_size)
+        object.__setattr__(self, 'support', rule_sup_count / dataset_size)
+        object.__setattr__(self, 'confidence', rule_sup_count / cond_sup_count if cond_sup_count != 0 else 0)
+        object.__setattr__(self, 'coverage', coverage)
+
+    def __setattr__(self, name, value):
+        if name in RuleItem.__slots__:
+            raise AttributeError("RuleItem is immutable, can't set " + name)
+        object.__setattr__(self, name, value)
+
+    def __eq__(self, other):
+        if not isinstance(other, RuleItem):
+            return NotImplemented
+        return self.cond_set == other.cond_set and self.class_label == other.class_label and \
+            self.cond_sup_count == other.cond_sup_count and self.rule_sup_count == other.rule_sup_count
+
+    def __hash__(self):
+        return hash((self.cond_set, self.class_label))
+
+    # pickle the fields in slots (including those of subclasses), since they can't be set by the default way
+    def __getstate__(self):
+        state = dict()
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
 
     # print out the ruleitem
     def print(self):
         cond_set_output = ''
-        for item in self.cond_set:
-            cond_set_output += '(' + str(item) + ', ' + str(self.cond_set[item]) + '), '
+        for item, value in self.cond_set:
+            cond_set_output += '(' + str(item) + ', ' + str(value) + '), '
         cond_set_output = cond_set_output[:-2]
         print('<({' + cond_set_output + '}, ' + str(self.cond_sup_count) + '), (' +
               '(class, ' + str(self.class_label) + '), ' + str(self.rule_sup_count) + ')>')
@@ -65,8 +140,8 @@ class RuleItem:
     # print out rule
     def print_rule(self):
         cond_set_output = ''
-        for item in self.cond_set:
-            cond_set_output += '(' + str(item) + ', ' + str(self.cond_set[item]) + '), '
+        for item, value in self.cond_set:
+            cond_set_output += '(' + str(item) + ', ' + str(value) + '), '
         cond_set_output = '{' + cond_set_output[:-2] + '}'
         print(cond_set_output + ' -> (class, ' + str(self.class_label) + ')')
 
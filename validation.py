@@ -4,60 +4,97 @@ Description: This is our experimental code. We provide 4 test modes for experime
     10-fold cross-validations on CBA (M1) with pruning
     10-fold cross-validations on CBA (M2) without pruning
     10-fold cross-validations on CBA (M2) with pruning
+    Each of them can discretize numerical attributes either once with the whole dataset, or with the training dataset of
+    each round only (fold-aware), which avoids test data leaking into discretization.
 Input: the relative directory path of data file and scheme file
 Output: the experimental results (similar to Table 1: Experiment Results in this paper)
 Author: CBA Studio
 """
 from read import read
 from pre_processing import pre_process
+from pre_processing import FoldDiscretizer
+from cache import load_dataset
 from cba_rg import rule_generator
+from cba_rg import MiningConfig
 from cba_cb_m1 import classifier_builder_m1
-from cba_cb_m1 import is_satisfy
 from cba_cb_m2 import classifier_builder_m2
+from encoded import EncodedDataset
+import numpy as np
 import time
 import random
 
 
-# calculate the error rate of the classifier on the dataset
-def get_error_rate(classifier, dataset):
-    size = len(dataset)
-    error_number = 0
-    for case in dataset:
-        is_satisfy_value = False
-        for rule in classifier.rule_list:
-            is_satisfy_value = is_satisfy(case, rule)
-            if is_satisfy_value == True:
-                break
-        if is_satisfy_value == False:
-            if classifier.default_class != case[-1]:
-                error_number += 1
-    return error_number / size
-
+# the limits of mining in experiments, the same as the former CBA-RG: stop when there are more than 2000 CARs, or when a
+#   level adds fewer than 10 new CARs (see MiningConfig in cba_rg.py)
+MINING_CONFIG = MiningConfig(max_rules=2000, min_new_rules=10)
 
-# 10-fold cross-validations on CBA (M1) without pruning
-def cross_validate_m1_without_prune(data_path, scheme_path, minsup=0.01, minconf=0.5):
-    data, attributes, value_type = read(data_path, scheme_path)
-    random.shuffle(data)
-    dataset = pre_process(data, attributes, value_type)
 
-    block_size = int(len(dataset) / 10)
+# calculate the error rate of the classifier on the dataset: each data case is classified by the first rule covering
+#   it, or by the default class if no rule covers it (see predict_batch in predictor.py)
+# dataset: a list of data cases, or an EncodedDataset (see encoded.py)
+def get_error_rate(classifier, dataset):
+    if isinstance(dataset, EncodedDataset):
+        predicted = classifier.predict_batch(dataset.matrix)
+        actual = np.array(dataset.class_labels)[dataset.classes]
+    else:
+        predicted = classifier.predict_batch([case[:-1] for case in dataset])
+        actual = np.array([case[-1] for case in dataset])
+    return int(np.count_nonzero(predicted != actual)) / len(dataset)
+
+
+# get the dataset after pre-processing in random order, it's read and pre-processed only at the first time, and loaded
+#   from the cache then (see cache.py)
+def read_dataset(data_path, scheme_path):
+    dataset, params = load_dataset(data_path, scheme_path)
+    order = list(range(len(dataset)))
+    random.shuffle(order)
+    return dataset[order]
+
+
+# split the dataset into 10 folds in random order, yield the training dataset and test dataset of each round
+# fold_aware: if False, the whole dataset is pre-processed once (see read_dataset); if True, the numerical columns are
+#   discretized with the walls found in the training dataset of each round (see FoldDiscretizer in pre_processing.py),
+#   so that the test dataset doesn't leak into discretization. The columns whose values aren't integers (e.g. in car,
+#   wine and zoo) are encoded by EncodedDataset (see encoded.py) with the same codes in every round, since the order of
+#   data is fixed once shuffled
+def split_folds(data_path, scheme_path, fold_aware=False):
+    if fold_aware:
+        data, attributes, value_type = read(data_path, scheme_path)
+        random.shuffle(data)
+        discretizer = FoldDiscretizer(data, value_type)
+        size = len(data)
+    else:
+        dataset = read_dataset(data_path, scheme_path)
+        size = len(dataset)
+
+    block_size = int(size / 10)
     split_point = [k * block_size for k in range(0, 10)]
-    split_point.append(len(dataset))
+    split_point.append(size)
+
+    for k in range(len(split_point)-1):
+        training_rows = list(range(0, split_point[k])) + list(range(split_point[k+1], size))
+        if fold_aware:
+            walls = discretizer.get_walls(training_rows)
+            dataset = EncodedDataset(pre_process([case[:] for case in data], attributes, value_type, walls=walls))
+        yield dataset[training_rows], dataset[split_point[k]:split_point[k+1]]
+
 
+# 10-fold cross-validations on CBA (M1) without pruning
+# fold_aware: whether to discretize with the training dataset of each round only, see split_folds
+# config: the limits of mining, see MiningConfig in cba_rg.py
+def cross_validate_m1_without_prune(data_path, scheme_path, minsup=0.01, minconf=0.5, fold_aware=False,
+                                    config=MINING_CONFIG):
     cba_rg_total_runtime = 0
     cba_cb_total_runtime = 0
     total_car_number = 0
     total_classifier_rule_num = 0
     error_total_rate = 0
 
-    for k in range(len(split_point)-1):
+    for k, (training_dataset, test_dataset) in enumerate(split_folds(data_path, scheme_path, fold_aware)):
         print("\nRound %d:" % k)
 
-        training_dataset = dataset[:split_point[k]] + dataset[split_point[k+1]:]
-        test_dataset = dataset[split_point[k]:split_point[k+1]]
-
         start_time = time.time()
-        cars = rule_generator(training_dataset, minsup, minconf)
+        cars = rule_generator(training_dataset, minsup, minconf, config=config)
         end_time = time.time()
         cba_rg_runtime = end_time - start_time
         cba_rg_total_runtime += cba_rg_runtime
@@ -88,29 +125,21 @@ def cross_validate_m1_without_prune(data_path, scheme_path, minsup=0.01, minconf
 
 
 # 10-fold cross-validations on CBA (M1) with pruning
-def cross_validate_m1_with_prune(data_path, scheme_path, minsup=0.01, minconf=0.5):
-    data, attributes, value_type = read(data_path, scheme_path)
-    random.shuffle(data)
-    dataset = pre_process(data, attributes, value_type)
-
-    block_size = int(len(dataset) / 10)
-    split_point = [k * block_size for k in range(0, 10)]
-    split_point.append(len(dataset))
-
+# fold_aware: whether to discretize with the training dataset of each round only, see split_folds
+# config: the limits of mining, see MiningConfig in cba_rg.py
+def cross_validate_m1_with_prune(data_path, scheme_path, minsup=0.01, minconf=0.5, fold_aware=False,
+                                 config=MINING_CONFIG):
     cba_rg_total_runtime = 0
     cba_cb_total_runtime = 0
     total_car_number = 0
     total_classifier_rule_num = 0
     error_total_rate = 0
 
-    for k in range(len(split_point)-1):
+    for k, (training_dataset, test_dataset) in enumerate(split_folds(data_path, scheme_path, fold_aware)):
         print("\nRound %d:" % k)
 
-        training_dataset = dataset[:split_point[k]] + dataset[split_point[k+1]:]
-        test_dataset = dataset[split_point[k]:split_point[k+1]]
-
         start_time = time.time()
-        cars = rule_generator(training_dataset, minsup, minconf)
+        cars = rule_generator(training_dataset, minsup, minconf, config=config)
         cars.prune_rules(training_dataset)
         cars.rules = cars.pruned_rules
         end_time = time.time()
@@ -143,29 +172,21 @@ def cross_validate_m1_with_prune(data_path, scheme_path, minsup=0.01, minconf=0.
 
 
 # 10-fold cross-validations on CBA (M2) without pruning
-def cross_validate_m2_without_prune(data_path, scheme_path, minsup=0.01, minconf=0.5):
-    data, attributes, value_type = read(data_path, scheme_path)
-    random.shuffle(data)
-    dataset = pre_process(data, attributes, value_type)
-
-    block_size = int(len(dataset) / 10)
-    split_point = [k * block_size for k in range(0, 10)]
-    split_point.append(len(dataset))
-
+# fold_aware: whether to discretize with the training dataset of each round only, see split_folds
+# config: the limits of mining, see MiningConfig in cba_rg.py
+def cross_validate_m2_without_prune(data_path, scheme_path, minsup=0.01, minconf=0.5, fold_aware=False,
+                                    config=MINING_CONFIG):
     cba_rg_total_runtime = 0
     cba_cb_total_runtime = 0
     total_car_number = 0
     total_classifier_rule_num = 0
     error_total_rate = 0
 
-    for k in range(len(split_point)-1):
+    for k, (training_dataset, test_dataset) in enumerate(split_folds(data_path, scheme_path, fold_aware)):
         print("\nRound %d:" % k)
 
-        training_dataset = dataset[:split_point[k]] + dataset[split_point[k+1]:]
-        test_dataset = dataset[split_point[k]:split_point[k+1]]
-
         start_time = time.time()
-        cars = rule_generator(training_dataset, minsup, minconf)
+        cars = rule_generator(training_dataset, minsup, minconf, config=config)
         end_time = time.time()
         cba_rg_runtime = end_time - start_time
         cba_rg_total_runtime += cba_rg_runtime
@@ -196,29 +217,21 @@ def cross_validate_m2_without_prune(data_path, scheme_path, minsup=0.01, minconf
 
 
 # 10-fold cross-validations on CBA (M2) with pruning
-def cross_validate_m2_with_prune(data_path, scheme_path, minsup=0.01, minconf=0.5):
-    data, attributes, value_type = read(data_path, scheme_path)
-    random.shuffle(data)
-    dataset = pre_process(data, attributes, value_type)
-
-    block_size = int(len(dataset) / 10)
-    split_point = [k * block_size for k in range(0, 10)]
-    split_point.append(len(dataset))
-
+# fold_aware: whether to discretize with the training dataset of each round only, see split_folds
+# config: the limits of mining, see MiningConfig in cba_rg.py
+def cross_validate_m2_with_prune(data_path, scheme_path, minsup=0.01, minconf=0.5, fold_aware=False,
+                                 config=MINING_CONFIG):
     cba_rg_total_runtime = 0
     cba_cb_total_runtime = 0
     total_car_number = 0
     total_classifier_rule_num = 0
     error_total_rate = 0
 
-    for k in range(len(split_point)-1):
+    for k, (training_dataset, test_dataset) in enumerate(split_folds(data_path, scheme_path, fold_aware)):
         print("\nRound %d:" % k)
 
-        training_dataset = dataset[:split_point[k]] + dataset[split_point[k+1]:]
-        test_dataset = dataset[split_point[k]:split_point[k+1]]
-
         start_time = time.time()
-        cars = rule_generator(training_dataset, minsup, minconf)
+        cars = rule_generator(training_dataset, minsup, minconf, config=config)
         cars.prune_rules(training_dataset)
         cars.rules = cars.pruned_rules
         end_time = time.time()
@@ -0,0 +1,112 @@
+"""
+Description: Vertical representation of a dataset for fast support counting. Instead of scanning every data case for
+    every ruleitem, we keep for each item (attribute, value) and for each class label a bitset of the row ids which
+    contain it. Python integers are used as bitsets, so the rows covered by a condset are the intersection (bitwise and)
+    of the bitsets of its items, and condsupCount / rulesupCount are just the popcount of the result.
+Input: a dataset got from pre_process (see pre_processing.py), or its EncodedDataset (see encoded.py)
+Output: a VerticalDataset, which can be passed to RuleItem instead of the original dataset (see ruleitem.py)
+Author: CBA Studio
+Reference: Zaki, M. J. "Scalable Algorithms for Association Mining." IEEE TKDE 12.3 (2000): 372-390.
+"""
+import encoded
+
+try:
+    popcount = int.bit_count        # Python 3.10+
+except AttributeError:
+    # count the number of 1 bits in the bitset
+    def popcount(bitset):
+        return bin(bitset).count('1')
+
+
+# convert a list of row ids into a bitset
+# indices: row ids in ascending order
+# size: number of rows in dataset
+def indices_to_bitset(indices, size):
+    buffer = bytearray((size + 7) // 8)
+    for i in indices:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bytes(buffer), 'little')
+
+
+# convert a bitset into the list of row ids it contains, in ascending order
+def bitset_to_indices(bitset):
+    indices = []
+    offset = 0
+    while bitset:
+        low_bits = bitset & 0xFFFFFFFFFFFFFFFF
+        while low_bits:
+            lowest = low_bits & -low_bits
+            indices.append(offset + lowest.bit_length() - 1)
+            low_bits ^= lowest
+        bitset >>= 64
+        offset += 64
+    return indices
+
+
+class VerticalDataset:
+    """
+    item_bitsets: a dict with following fashion:
+            {(item name, value): bitset, ...}
+        where the i-th bit of bitset is 1 iff the i-th data case has this value on this item.
+    class_bitsets: a dict {class label: bitset}, marking the data cases belonging to each class.
+    all_rows: the bitset with all rows of the dataset.
+    size: number of data cases.
+    """
+    def __init__(self, dataset):
+        self.size = len(dataset)
+        self.all_rows = (1 << self.size) - 1
+
+        if isinstance(dataset, encoded.EncodedDataset):
+            self.item_bitsets, self.class_bitsets = dataset.to_bitsets()
+            return
+
+        item_indices = dict()
+        class_indices = dict()
+        for i, case in enumerate(dataset):
+            for column in range(len(case) - 1):
+                item_indices.setdefault((column, case[column]), []).append(i)
+            class_indices.setdefault(case[-1], []).append(i)
+
+        self.item_bitsets = dict((item, indices_to_bitset(indices, self.size))
+                                 for item, indices in item_indices.items())
+        self.class_bitsets = dict((label, indices_to_bitset(indices, self.size))
+                                  for label, indices in class_indices.items())
+
+    def __len__(self):
+        return self.size
+
+    # get the bitset of data cases whose LHS satisfy the cond_set, a tuple of (item name, value)
+    def cover(self, cond_set):
+        bitset = self.all_rows
+        for item in cond_set:
+            bitset &= self.item_bitsets.get(item, 0)
+            if not bitset:
+                break
+        return bitset
+
+    # calculate condsupCount and rulesupCount of the ruleitem <cond_set, class_label>
+    def get_sup_count(self, cond_set, class_label):
+        bitset = self.cover(cond_set)
+        cond_sup_count = popcount(bitset)
+        rule_sup_count = popcount(bitset & self.class_bitsets.get(class_label, 0))
+        return cond_sup_count, rule_sup_count
+
+    # calculate condsupCount of cond_set and rulesupCount of every class label with one intersection of items, return
+    #   condsupCount and a dict {class label: rulesupCount}
+    def get_class_histogram(self, cond_set):
+        bitset = self.cover(cond_set)
+        histogram = dict()
+        if bitset:
+            for label, class_bitset in self.class_bitsets.items():
+                histogram[label] = popcount(bitset & class_bitset)
+        return popcount(bitset), histogram
+
+
+# just for test
+if __name__ == '__main__':
+    dataset = [[1, 1, 1], [1, 1, 1], [1, 2, 1], [2, 2, 1], [2, 2, 1],
+               [2, 2, 0], [2, 3, 0], [2, 3, 0], [1, 1, 0], [3, 2, 0]]
+    vertical_dataset = VerticalDataset(dataset)
+    print(vertical_dataset.get_sup_count(((0, 1), (1, 1)), 1))        # should be (3, 2)
+    print(vertical_dataset.get_class_histogram(((0, 1),)))            # should be (4, {1: 3, 0: 1})
+    print(bitset_to_indices(vertical_dataset.cover(((0, 2),))))       # should be [3, 4, 5, 6, 7]